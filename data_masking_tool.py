@@ -6,14 +6,2066 @@ A comprehensive tool for applying anonymization and masking to sensitive data
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
 import pandas as pd
+import numpy as np
 import json
 from pathlib import Path
 from datetime import datetime
 from faker import Faker
-from cryptography.fernet import Fernet
+from cryptography.fernet import Fernet, InvalidToken
 import re
 import hashlib
 import base64
+import io
+import socket
+import subprocess
+import time
+import math
+import bz2
+import gzip
+import queue
+import argparse
+import os
+import sys
+import sqlite3
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import asyncio
+from openpyxl import Workbook, load_workbook
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # Optional: Arrow record batches and the multithreaded CSV engine
+    pa = None
+    pa_csv = None
+
+try:
+    import zstandard
+except ImportError:  # Optional: .zst compression
+    zstandard = None
+
+
+# Default number of rows read, masked and written at a time by the streaming paths
+DEFAULT_CHUNK_ROWS = 10000
+
+# Rule types whose output can be turned back into the original value
+REVERSIBLE_TYPES = ('Reversible (with key)', 'Format-Preserving Encryption')
+
+
+# Built-in PII patterns for free-text scrubbing. Earlier patterns win when
+# two could match at the same position.
+PII_PATTERNS = {
+    'EMAIL': r'[A-Za-z0-9._%+-]+@[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)*\.[A-Za-z]{2,}',
+    'SSN': r'(?<!\d)\d{3}-\d{2}-\d{4}(?!\d)',
+    'CREDIT_CARD': r'(?<!\d)(?:\d{4}[ -]?){3}\d{4}(?!\d)',
+    'PHONE': r'(?<![\w+])(?:\+?1[ .-]?)?(?:\(\d{3}\)|\d{3})[ .-]?\d{3}[ .-]?\d{4}(?:\s*(?:x|ext\.?)\s*\d+)?(?!\d)',
+}
+
+# Replacement strategies for free-text scrubbing
+SCRUB_STRATEGIES = ('redact', 'mask', 'hash')
+
+# Below this many cells a column is scrubbed in-process even with workers set;
+# kept well under DEFAULT_CHUNK_ROWS so streamed chunks use the pool
+PARALLEL_SCRUB_MIN_CELLS = 2000
+
+
+def terms_regex(terms):
+    """Compile dictionary terms into one trie-shaped regex.
+
+    Terms sharing a prefix share a branch, so matching a large dictionary
+    costs about one pass over the text instead of one attempt per term.
+    """
+    trie = {}
+    for term in terms:
+        node = trie
+        for ch in term:
+            node = node.setdefault(ch, {})
+        node[''] = {}
+
+    def build(node):
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ''
+        optional = '' in node
+        if len(branches) == 1 and not optional:
+            return branches[0]
+        return '(?:' + '|'.join(branches) + ')' + ('?' if optional else '')
+
+    return build(trie)
+
+
+class TextScrubber:
+    """Finds every PII match in free text with one combined, precompiled regex.
+
+    Each built-in pattern (and the dictionary terms, as TERM) is a named group
+    of a single alternation, so a cell is scanned once no matter how many
+    patterns are enabled. Every match is replaced with the strategy configured
+    for its pattern: 'redact' ([EMAIL]), 'mask' (****) or 'hash'.
+    """
+
+    def __init__(self, patterns=None, terms=None, strategies=None, default_strategy='redact',
+                 ignore_case=True, workers=1):
+        self.config = {
+            'patterns': list(PII_PATTERNS) if patterns is None else list(patterns),
+            'terms': list(terms or []),
+            'strategies': dict(strategies or {}),
+            'default_strategy': default_strategy,
+            'ignore_case': ignore_case,
+        }
+        groups = [f'(?P<{name}>{PII_PATTERNS[name]})' for name in self.config['patterns']]
+        terms = [term.strip() for term in self.config['terms'] if term.strip()]
+        if terms:
+            if ignore_case:
+                terms = {term.lower() for term in terms}
+            flags = '(?i:' if ignore_case else '(?:'
+            groups.append(rf'(?P<TERM>(?<!\w){flags}{terms_regex(terms)})(?!\w))')
+        self.regex = re.compile('|'.join(groups)) if groups else None
+        # Every built-in pattern needs an '@' or a digit; cells without one are
+        # skipped with a single C-level scan unless dictionary terms are in use
+        self._trigger = re.compile(r'[@\d]') if groups and not terms else None
+        for name in list(self.config['strategies'].values()) + [default_strategy]:
+            if name not in SCRUB_STRATEGIES:
+                raise ValueError(f"Unknown scrub strategy: {name}")
+        self.workers = workers
+        self._executor = None
+
+    def _replace(self, match):
+        kind = match.lastgroup
+        strategy = self.config['strategies'].get(kind, self.config['default_strategy'])
+        text = match.group()
+        if strategy == 'mask':
+            return '*' * len(text)
+        if strategy == 'hash':
+            return hashlib.sha256(text.encode()).hexdigest()[:16]
+        return f'[{kind}]'
+
+    def scrub(self, text):
+        """Return text with every match replaced"""
+        if self.regex is None or (self._trigger is not None and not self._trigger.search(text)):
+            return text
+        return self.regex.sub(self._replace, text)
+
+    def scrub_values(self, values):
+        return [self.scrub(value) for value in values]
+
+    def submit_series(self, series):
+        """Start scrubbing a column; returns a callable that returns the scrubbed column.
+
+        Large columns are split across worker processes without blocking, so
+        the caller can prepare the next chunk while they are scrubbed.
+        """
+        present = series.notna()
+        values = series[present].astype(str).tolist()
+        if self.workers > 1 and len(values) >= PARALLEL_SCRUB_MIN_CELLS:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, initializer=_init_scrub_worker, initargs=(self.config,)
+                )
+            step = -(-len(values) // (self.workers * 4))
+            futures = [self._executor.submit(_scrub_part, values[i:i + step])
+                       for i in range(0, len(values), step)]
+
+            def collect():
+                return [value for future in futures for value in future.result()]
+        else:
+            scrubbed = self.scrub_values(values)
+
+            def collect():
+                return scrubbed
+
+        def result():
+            column = series.astype(object)
+            column[present] = collect()
+            return column
+
+        return result
+
+    def scrub_series(self, series):
+        """Scrub every non-null cell of a column, in worker processes for large columns"""
+        return self.submit_series(series)()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+# Scrubber of the current worker process for parallel scrubbing
+_scrub_state = {}
+
+
+def _init_scrub_worker(config):
+    _scrub_state['scrubber'] = TextScrubber(**config)
+
+
+def _scrub_part(values):
+    return _scrub_state['scrubber'].scrub_values(values)
+
+
+class MaskingEngine:
+    """Masking plan shared by the GUI and the streaming file paths.
+
+    Holds the rules, the Faker instance, cached Fernet ciphers and the
+    reverse mapping so every chunk of a file is masked with the same state.
+    With a deterministic_key, fake and randomized values are derived from a
+    keyed hash of the original value, so every engine sharing the key masks
+    a value the same way.
+    """
+
+    def __init__(self, rules, faker=None, reverse_mapping=None, track_reverse_mapping=True, fake_pool_size=0,
+                 deterministic_key=None):
+        self.rules = rules
+        self.faker = faker if faker is not None else Faker()
+        self.reverse_mapping = reverse_mapping if reverse_mapping is not None else {}
+        # Long-running callers turn this off so the mapping does not grow forever
+        self.track_reverse_mapping = track_reverse_mapping
+        # With a pool size, fake values are drawn from pre-generated pools
+        self.fake_pool_size = fake_pool_size
+        if isinstance(deterministic_key, str):
+            deterministic_key = deterministic_key.encode()
+        self.deterministic_key = deterministic_key
+        self._fake_pools = {}
+        self._ciphers = {}
+        self._scrubbers = {}
+
+    def warm(self):
+        """Build ciphers and fake-value pools up front for every rule"""
+        for field, rule in self.rules.items():
+            if rule['type'] in REVERSIBLE_TYPES:
+                self.get_cipher(rule['options'].get('key', ''))
+            elif rule['type'] == 'Fake Data Replacement' and self.fake_pool_size:
+                self.fake_value(field)
+        return self
+
+    def get_cipher(self, key):
+        """Return a cached Fernet cipher for the given key"""
+        cipher = self._ciphers.get(key)
+        if cipher is None:
+            cipher = Fernet(key.encode() if isinstance(key, str) else key)
+            self._ciphers[key] = cipher
+        return cipher
+
+    def fake_generator(self, field_name):
+        """Pick a Faker provider based on the field name"""
+        lower_field = field_name.lower()
+        if 'email' in lower_field:
+            return self.faker.email
+        elif 'phone' in lower_field:
+            return self.faker.phone_number
+        elif 'name' in lower_field:
+            if 'first' in lower_field:
+                return self.faker.first_name
+            elif 'last' in lower_field:
+                return self.faker.last_name
+            return self.faker.name
+        elif 'address' in lower_field:
+            return self.faker.address
+        elif 'ssn' in lower_field:
+            return self.faker.ssn
+        elif 'company' in lower_field:
+            return self.faker.company
+        return self.faker.word
+
+    def value_seed(self, field_name, value_str):
+        """64-bit keyed hash of a field's value (deterministic mode only)"""
+        digest = hashlib.blake2b(f"{field_name}\x00{value_str}".encode(), digest_size=8,
+                                 key=self.deterministic_key).digest()
+        return int.from_bytes(digest, 'big')
+
+    def fake_value(self, field_name, value_str=None):
+        """Return a fake value for a field, from its pool when pooling is enabled.
+
+        In deterministic mode the value is picked by value_seed(), so the same
+        original always gets the same fake value.
+        """
+        seed = self.value_seed(field_name, value_str) if self.deterministic_key else None
+        if not self.fake_pool_size:
+            if seed is not None:
+                self.faker.seed_instance(seed)
+            return self.fake_generator(field_name)()
+        pool = self._fake_pools.get(field_name)
+        if pool is None:
+            if self.deterministic_key:
+                # Every engine with the key must build the same pool
+                self.faker.seed_instance(self.value_seed(field_name, ''))
+            generator = self.fake_generator(field_name)
+            pool = [generator() for _ in range(self.fake_pool_size)]
+            self._fake_pools[field_name] = pool
+        if seed is not None:
+            return pool[seed % len(pool)]
+        return self.faker.random.choice(pool)
+
+    def get_scrubber(self, field_name, options):
+        """Return the compiled free-text scrubber for a field"""
+        scrubber = self._scrubbers.get(field_name)
+        if scrubber is None:
+            scrubber = TextScrubber(
+                patterns=options.get('patterns'),
+                terms=options.get('terms'),
+                strategies=options.get('strategies'),
+                default_strategy=options.get('default_strategy', 'redact'),
+                ignore_case=options.get('ignore_case', True),
+                workers=options.get('workers', 1),
+            )
+            self._scrubbers[field_name] = scrubber
+        return scrubber
+
+    def mask_series(self, series, field_name):
+        """Apply the rule for field_name to every value of a column"""
+        rule = self.rules[field_name]
+        if rule['type'] == 'Free-Text Scrubbing':
+            return self.get_scrubber(field_name, rule['options']).scrub_series(series)
+        return series.apply(lambda x: self.mask_value(x, rule, field_name))
+
+    def close(self):
+        """Shut down worker pools started by free-text scrubbers"""
+        for scrubber in self._scrubbers.values():
+            scrubber.close()
+
+    def submit_chunk(self, chunk):
+        """Start masking a DataFrame chunk; returns a callable that returns the masked copy.
+
+        Free-text columns with scrub workers are scrubbed in the background;
+        every other column is masked before this returns.
+        """
+        masked = chunk.copy()
+        pending = {}
+        for field, rule in self.rules.items():
+            if field not in masked.columns:
+                continue
+            if rule['type'] == 'Free-Text Scrubbing':
+                pending[field] = self.get_scrubber(field, rule['options']).submit_series(masked[field])
+            else:
+                masked[field] = self.mask_series(masked[field], field)
+
+        def result():
+            for field, collect in pending.items():
+                masked[field] = collect()
+            return masked
+
+        return result
+
+    def mask_chunk(self, chunk):
+        """Return a masked copy of a DataFrame chunk.
+
+        Fields without a column in the chunk are skipped, so one rule set can
+        be applied to every sheet of a workbook.
+        """
+        return self.submit_chunk(chunk)()
+
+    def mask_value(self, value, rule, field_name):
+        """Apply masking to a single value"""
+        if pd.isna(value):
+            return value
+            
+        masking_type = rule['type']
+        options = rule['options']
+        value_str = str(value)
+        
+        if masking_type == 'Full Masking (****)':
+            return '*' * len(value_str)
+            
+        elif masking_type == 'Partial Masking':
+            keep_first = options.get('keep_first', 0)
+            keep_last = options.get('keep_last', 4)
+            if len(value_str) <= keep_first + keep_last:
+                return '*' * len(value_str)
+            masked = value_str[:keep_first] + '*' * (len(value_str) - keep_first - keep_last) + value_str[-keep_last:]
+            return masked
+            
+        elif masking_type == 'Format-Preserving Encryption':
+            fernet = self.get_cipher(options.get('key', ''))
+            encrypted = fernet.encrypt(value_str.encode())
+            encoded = base64.urlsafe_b64encode(encrypted).decode()
+            if self.track_reverse_mapping:
+                # Store reverse mapping
+                self.reverse_mapping.setdefault(field_name, {})[encoded] = value_str
+            return encoded
+            
+        elif masking_type == 'Fake Data Replacement':
+            return self.fake_value(field_name, value_str)
+                
+        elif masking_type == 'Hash (One-way)':
+            return hashlib.sha256(value_str.encode()).hexdigest()[:16]
+            
+        elif masking_type == 'Reversible (with key)':
+            fernet = self.get_cipher(options.get('key', ''))
+            encrypted = fernet.encrypt(value_str.encode())
+            encoded = encrypted.decode()
+            if self.track_reverse_mapping:
+                # Store reverse mapping
+                self.reverse_mapping.setdefault(field_name, {})[encoded] = value_str
+            return encoded
+            
+        elif masking_type == 'Email Masking':
+            if '@' in value_str:
+                local, domain = value_str.split('@', 1)
+                if len(local) > 2:
+                    masked_local = local[0] + '*' * (len(local) - 2) + local[-1]
+                else:
+                    masked_local = '*' * len(local)
+                return f"{masked_local}@{domain}"
+            return '*' * len(value_str)
+            
+        elif masking_type == 'Phone Masking':
+            # Keep last 4 digits
+            digits = re.sub(r'\D', '', value_str)
+            if len(digits) >= 4:
+                return '*' * (len(value_str) - 4) + value_str[-4:]
+            return '*' * len(value_str)
+            
+        elif masking_type == 'SSN Masking':
+            # Keep last 4 digits
+            digits = re.sub(r'\D', '', value_str)
+            if len(digits) >= 4:
+                return '***-**-' + digits[-4:]
+            return '*' * len(value_str)
+            
+        elif masking_type == 'Date Shifting':
+            try:
+                shift_days = options.get('shift_days', 30)
+                date_value = pd.to_datetime(value)
+                shifted = date_value + pd.Timedelta(days=shift_days)
+                return shifted.strftime('%Y-%m-%d')
+            except:
+                return value
+                
+        elif masking_type == 'Free-Text Scrubbing':
+            return self.get_scrubber(field_name, options).scrub(value_str)
+            
+        elif masking_type == 'Number Randomization':
+            try:
+                num = float(value)
+                if self.deterministic_key:
+                    fraction = self.value_seed(field_name, value_str) / 2.0 ** 64
+                else:
+                    fraction = self.faker.random.random()
+                # Add random noise (±10%)
+                noise = num * 0.1 * (2 * fraction - 1)
+                return round(num + noise, 2)
+            except:
+                return value
+                
+        return value
+
+
+def _excel_columns(header):
+    """Build column names from a worksheet header row"""
+    return [str(name) if name is not None else f"Unnamed: {i}" for i, name in enumerate(header)]
+
+
+def iter_excel_chunks(file_path, chunksize=DEFAULT_CHUNK_ROWS):
+    """Stream every sheet of an XLSX workbook as (sheet_name, DataFrame) chunks.
+
+    The workbook is opened in read-only mode so rows are parsed lazily instead
+    of building the full DOM. The first row of each sheet is the header. A
+    sheet without data rows yields a single empty chunk so its header is kept.
+    """
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for worksheet in workbook.worksheets:
+            rows = worksheet.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                yield worksheet.title, pd.DataFrame()
+                continue
+            columns = _excel_columns(header)
+            width = len(columns)
+            batch = []
+            emitted = False
+            for row in rows:
+                if len(row) != width:
+                    row = tuple(row[:width]) + (None,) * (width - len(row))
+                batch.append(row)
+                if len(batch) >= chunksize:
+                    yield worksheet.title, pd.DataFrame(batch, columns=columns)
+                    batch = []
+                    emitted = True
+            if batch or not emitted:
+                yield worksheet.title, pd.DataFrame(batch, columns=columns)
+    finally:
+        workbook.close()
+
+
+def read_excel_sheet(file_path, chunksize=DEFAULT_CHUNK_ROWS):
+    """Read the first sheet of an XLSX workbook through the streaming reader"""
+    frames = []
+    first_sheet = None
+    chunks = iter_excel_chunks(file_path, chunksize)
+    try:
+        for sheet_name, chunk in chunks:
+            if first_sheet is None:
+                first_sheet = sheet_name
+            elif sheet_name != first_sheet:
+                break
+            frames.append(chunk)
+    finally:
+        chunks.close()
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+
+class ExcelStreamWriter:
+    """Write-only XLSX writer that appends DataFrame chunks sheet by sheet.
+
+    Rows are serialized as they are appended, so memory stays bounded by the
+    chunk size rather than the workbook size.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.workbook = Workbook(write_only=True)
+        self._sheets = {}
+
+    def write_chunk(self, sheet_name, chunk):
+        """Append a chunk to a sheet, creating the sheet and header on first use"""
+        worksheet = self._sheets.get(sheet_name)
+        if worksheet is None:
+            worksheet = self.workbook.create_sheet(title=sheet_name)
+            worksheet.append([str(col) for col in chunk.columns])
+            self._sheets[sheet_name] = worksheet
+        if chunk.empty:
+            return
+        # NaN/NaT are not valid cell values; write them as empty cells
+        values = chunk.astype(object).where(chunk.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            worksheet.append(row)
+
+    def close(self):
+        """Save the workbook to disk"""
+        if not self._sheets:
+            self.workbook.create_sheet(title="Sheet1")
+        self.workbook.save(self.file_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        return False
+
+
+# Compressed file suffixes and the codec used for each
+COMPRESSIONS = {'.gz': 'gzip', '.bz2': 'bz2', '.zst': 'zstd'}
+
+
+def detect_compression(file_path):
+    """Return the codec implied by the file suffix, or None"""
+    return COMPRESSIONS.get(Path(file_path).suffix.lower())
+
+
+def data_suffix(file_path):
+    """Return the data format suffix, ignoring a compression suffix ('x.csv.gz' -> '.csv')"""
+    path = Path(file_path)
+    if detect_compression(path):
+        path = path.with_suffix('')
+    return path.suffix.lower()
+
+
+def compress_block(compression, data, level=None):
+    """Compress one block as a self-contained gzip member, bz2 stream or zstd frame"""
+    if compression == 'gzip':
+        return gzip.compress(data, compresslevel=6 if level is None else level)
+    if compression == 'bz2':
+        return bz2.compress(data, 9 if level is None else level)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ValueError("zstd compression needs the zstandard package")
+        return zstandard.ZstdCompressor(level=3 if level is None else level).compress(data)
+    raise ValueError(f"Unsupported compression: {compression}")
+
+
+class ParallelCompressedWriter:
+    """Binary output file whose blocks are compressed on a thread pool.
+
+    Every write() becomes an independent gzip member, bz2 stream or zstd frame.
+    Concatenated in order they form a valid file that gzip/bzip2/zstd and
+    pandas read as one stream. The codecs release the GIL, so compression runs
+    alongside masking instead of after it.
+    """
+
+    def __init__(self, file_path, compression, level=None, workers=None):
+        if compression == 'zstd' and zstandard is None:
+            raise ValueError("zstd compression needs the zstandard package")
+        self.compression = compression
+        self.level = level
+        workers = workers or os.cpu_count() or 1
+        self._window = workers * 2
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._pending = deque()
+        self._handle = open(file_path, 'wb')
+
+    def write(self, data):
+        if not data:
+            return
+        self._pending.append(self._executor.submit(compress_block, self.compression, data, self.level))
+        # Write finished blocks in order, and wait once too many are in flight
+        while self._pending and (len(self._pending) > self._window or self._pending[0].done()):
+            self._handle.write(self._pending.popleft().result())
+
+    def close(self):
+        try:
+            while self._pending:
+                self._handle.write(self._pending.popleft().result())
+        finally:
+            self._executor.shutdown(cancel_futures=True)
+            self._handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def prefetch(iterable, depth=2):
+    """Iterate on a background thread, keeping up to depth items ready.
+
+    Used to overlap decompression and parsing of the next chunk with masking
+    of the current one. Closing this generator early (or an error in the
+    consumer) stops the background thread, which then closes the source so
+    its input file is released.
+    """
+    items = queue.Queue(maxsize=depth)
+    done = object()
+    stop = threading.Event()
+    source = iter(iterable)
+
+    def put(entry):
+        # Give up once the consumer has gone away
+        while not stop.is_set():
+            try:
+                items.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in source:
+                if not put((True, item)):
+                    return
+            put((True, done))
+        except BaseException as e:
+            put((False, e))
+        finally:
+            # The source generator runs on this thread, so it is closed here
+            close = getattr(source, 'close', None)
+            if close is not None:
+                close()
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            ok, item = items.get()
+            if not ok:
+                raise item
+            if item is done:
+                return
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+# CSV parse/serialize engines: pandas' C parser, or Arrow's multithreaded reader/writer
+IO_ENGINES = ('pandas', 'pyarrow')
+
+
+def require_io_engine(io_engine):
+    """Validate an I/O engine name and that its package is installed"""
+    if io_engine not in IO_ENGINES:
+        raise ValueError(f"Unknown I/O engine: {io_engine}")
+    if io_engine == 'pyarrow' and pa is None:
+        raise ValueError("The pyarrow I/O engine needs the pyarrow package")
+
+
+# Bytes of CSV text per block; blocks are parsed by Arrow on separate threads
+ARROW_BLOCK_BYTES = 4 * 1024 * 1024
+
+
+def iter_csv_blocks(file_path, block_bytes=ARROW_BLOCK_BYTES):
+    """Yield the header line, then line-aligned blocks of a (possibly compressed) CSV file.
+
+    Like Arrow's reader with default options, this assumes no quoted value
+    spans lines.
+    """
+    with open_binary_input(file_path) as handle:
+        yield handle.readline()
+        rest = b''
+        while True:
+            data = handle.read(block_bytes)
+            if not data:
+                break
+            data = rest + data
+            cut = data.rfind(b'\n') + 1
+            rest = data[cut:]
+            if cut:
+                yield data[:cut]
+        if rest:
+            yield rest
+
+
+def _parse_arrow_block(block, names, text_columns, as_text):
+    """Parse one CSV block (without header) into a DataFrame with Arrow.
+
+    Arrow infers each block's column types on its own, so a value that does
+    not fit earlier blocks only affects its own block. Date and time columns
+    are kept as text, as pandas reads them: a block where Arrow found one is
+    parsed again, and the column is added to text_columns (shared by all
+    blocks) so later blocks read it as text straight away.
+    """
+    read_options = pa_csv.ReadOptions(column_names=names, use_threads=False)
+
+    def parse(columns):
+        convert_options = pa_csv.ConvertOptions(
+            strings_can_be_null=True, column_types={name: pa.string() for name in columns}
+        )
+        return pa_csv.read_csv(pa.py_buffer(block), read_options=read_options, convert_options=convert_options)
+
+    if as_text:
+        return parse(names).to_pandas()
+    known = set(text_columns)
+    table = parse(known)
+    temporal = {field.name for field in table.schema if pa.types.is_temporal(field.type)}
+    if temporal:
+        text_columns.update(temporal)
+        table = parse(known | temporal)
+    return table.to_pandas()
+
+
+def iter_arrow_csv_chunks(file_path, chunksize=DEFAULT_CHUNK_ROWS, dtype=None, workers=None,
+                          block_bytes=ARROW_BLOCK_BYTES):
+    """Stream a CSV file through Arrow as DataFrame chunks, parsing blocks in parallel.
+
+    The file (decompressed if needed) is cut into line-aligned blocks that
+    are parsed with pa_csv.read_csv on a thread pool (Arrow's parser releases
+    the GIL) and yielded in order, as chunks of at most chunksize rows. With
+    dtype=str every column is read as text.
+    """
+    blocks = iter_csv_blocks(file_path, block_bytes)
+    workers = workers or os.cpu_count() or 1
+    executor = ThreadPoolExecutor(max_workers=workers)
+    pending = deque()
+
+    def chunks_of(frame):
+        for start in range(0, len(frame), chunksize):
+            yield frame.iloc[start:start + chunksize].reset_index(drop=True)
+
+    try:
+        header = next(blocks, b'')
+        if not header.strip():
+            return
+        names = pa_csv.read_csv(pa.py_buffer(header)).column_names
+        text_columns = set()
+        for block in blocks:
+            pending.append(executor.submit(_parse_arrow_block, block, names, text_columns, dtype is str))
+            # Keep a bounded number of blocks in flight
+            if len(pending) > workers * 2:
+                yield from chunks_of(pending.popleft().result())
+        while pending:
+            yield from chunks_of(pending.popleft().result())
+    finally:
+        executor.shutdown(cancel_futures=True)
+        blocks.close()
+
+
+def iter_file_chunks(file_path, chunksize=DEFAULT_CHUNK_ROWS, io_engine='pandas', dtype=None):
+    """Stream a CSV or XLSX file as (sheet_name, DataFrame) chunks.
+
+    CSV files have a single unnamed sheet (sheet_name is None) and may be
+    gzip, bz2 or zstd compressed; they are decompressed as they are read.
+    io_engine picks the CSV parser; dtype=str reads CSV columns as text.
+    """
+    if data_suffix(file_path) == '.xlsx':
+        yield from iter_excel_chunks(file_path, chunksize)
+        return
+    require_io_engine(io_engine)
+    if io_engine == 'pyarrow':
+        for chunk in iter_arrow_csv_chunks(file_path, chunksize, dtype):
+            yield None, chunk
+        return
+    with pd.read_csv(file_path, chunksize=chunksize, dtype=dtype) as reader:
+        for chunk in reader:
+            yield None, chunk
+
+
+def read_csv_file(file_path, io_engine='pandas'):
+    """Read a whole (optionally compressed) CSV file with the chosen engine"""
+    require_io_engine(io_engine)
+    if io_engine == 'pyarrow':
+        frames = list(iter_arrow_csv_chunks(file_path, chunksize=sys.maxsize))
+        if frames:
+            return pd.concat(frames, ignore_index=True)
+    return pd.read_csv(file_path)
+
+
+def arrow_csv_bytes(chunk, include_header):
+    """Serialize a DataFrame chunk to CSV bytes with Arrow's writer.
+
+    Unlike pandas, Arrow quotes every text field, writes booleans as
+    true/false and whole floats without a decimal point.
+    """
+    try:
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Masked columns can mix types (e.g. numbers and untouched text)
+        mixed = {col: 'string' for col in chunk.columns if chunk[col].dtype == object}
+        table = pa.Table.from_pandas(chunk.astype(mixed), preserve_index=False)
+    sink = pa.BufferOutputStream()
+    pa_csv.write_csv(table, sink, write_options=pa_csv.WriteOptions(include_header=include_header))
+    return sink.getvalue().to_pybytes()
+
+
+def pandas_csv_bytes(chunk, include_header):
+    """Serialize a DataFrame chunk to CSV bytes with pandas"""
+    return chunk.to_csv(index=False, header=include_header).encode('utf-8')
+
+
+def open_binary_output(file_path, compression_level=None):
+    """Open a binary output file, compressing it when the suffix asks for it"""
+    compression = detect_compression(file_path)
+    if compression:
+        return ParallelCompressedWriter(file_path, compression, compression_level)
+    return open(file_path, 'wb')
+
+
+def open_binary_input(file_path):
+    """Open a binary input file, decompressing it when the suffix asks for it"""
+    compression = detect_compression(file_path)
+    if compression == 'gzip':
+        return gzip.open(file_path, 'rb')
+    if compression == 'bz2':
+        return bz2.open(file_path, 'rb')
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ValueError("zstd compression needs the zstandard package")
+        # Output of ParallelCompressedWriter is a sequence of frames
+        reader = zstandard.ZstdDecompressor().stream_reader(open(file_path, 'rb'), read_across_frames=True)
+        return io.BufferedReader(reader)
+    return open(file_path, 'rb')
+
+
+class CsvStreamWriter:
+    """CSV writer that appends DataFrame chunks, writing the header once.
+
+    A .gz, .bz2 or .zst output path is compressed chunk by chunk with a
+    ParallelCompressedWriter. With the pyarrow engine, chunks are serialized
+    on a thread pool (Arrow's writer releases the GIL) and written in order,
+    so serialization overlaps with masking of the following chunks.
+    """
+
+    def __init__(self, file_path, compression_level=None, io_engine='pandas', workers=None):
+        require_io_engine(io_engine)
+        self.file_path = file_path
+        self._handle = open_binary_output(file_path, compression_level)
+        self._header_written = False
+        self._sheet_name = None
+        self._serialize = arrow_csv_bytes if io_engine == 'pyarrow' else pandas_csv_bytes
+        self._executor = None
+        self._pending = deque()
+        if io_engine == 'pyarrow':
+            workers = workers or os.cpu_count() or 1
+            self._window = workers * 2
+            self._executor = ThreadPoolExecutor(max_workers=workers)
+
+    def write_chunk(self, sheet_name, chunk):
+        """Append a chunk; all chunks must come from the same sheet"""
+        include_header = not self._header_written
+        if include_header:
+            self._sheet_name = sheet_name
+        elif sheet_name != self._sheet_name:
+            raise ValueError(f"Cannot write sheet '{sheet_name}' after sheet '{self._sheet_name}' to one CSV file")
+        self._header_written = True
+        if self._executor is None:
+            self._handle.write(self._serialize(chunk, include_header))
+            return
+        self._pending.append(self._executor.submit(self._serialize, chunk, include_header))
+        while self._pending and (len(self._pending) > self._window or self._pending[0].done()):
+            self._handle.write(self._pending.popleft().result())
+
+    def close(self):
+        """Flush pending chunks and close the output file"""
+        try:
+            while self._pending:
+                self._handle.write(self._pending.popleft().result())
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+            self._handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def open_chunk_writer(file_path, compression_level=None, io_engine='pandas'):
+    """Return a streaming writer matching the output file extension"""
+    if data_suffix(file_path) == '.xlsx':
+        return ExcelStreamWriter(file_path)
+    return CsvStreamWriter(file_path, compression_level, io_engine)
+
+
+def check_sheet_output(input_path, output_path):
+    """Refuse to write a multi-sheet workbook to a single CSV file"""
+    if data_suffix(input_path) != '.xlsx' or data_suffix(output_path) == '.xlsx':
+        return
+    workbook = load_workbook(input_path, read_only=True)
+    try:
+        sheets = workbook.sheetnames
+    finally:
+        workbook.close()
+    if len(sheets) > 1:
+        raise ValueError(f"{Path(input_path).name} has {len(sheets)} sheets ({', '.join(sheets)}); "
+                         "write it to an .xlsx file or save each sheet separately")
+
+
+def value_hashes(series):
+    """64-bit hashes of the text form of a column's values (vectorized)"""
+    return pd.util.hash_pandas_object(series.astype(str), index=False).to_numpy(dtype=np.uint64)
+
+
+class HyperLogLog:
+    """Approximate distinct counter (about 1.04 / sqrt(2 ** precision) relative error)"""
+
+    def __init__(self, precision=14):
+        if not 11 <= precision <= 18:
+            raise ValueError("HyperLogLog precision must be between 11 and 18")
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = np.zeros(self.size, dtype=np.uint8)
+        self.alpha = 0.7213 / (1 + 1.079 / self.size)
+
+    def add_hashes(self, hashes):
+        if len(hashes) == 0:
+            return
+        bits = 64 - self.precision
+        index = (hashes >> np.uint64(bits)).astype(np.intp)
+        rest = hashes & np.uint64((1 << bits) - 1)
+        # Rank is the position of the leftmost 1-bit in the remaining bits;
+        # with at most 53 bits left, frexp's exponent is the exact bit length
+        bit_length = np.frexp(rest.astype(np.float64))[1]
+        rank = (bits - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def count(self):
+        estimate = self.alpha * self.size ** 2 / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * self.size and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = self.size * math.log(self.size / zeros)
+        return int(round(estimate))
+
+
+class BloomFilter:
+    """Bit-packed Bloom filter over 64-bit hashes, using double hashing"""
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.size = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.hash_count = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+
+    def _positions(self, hashes):
+        low = hashes & np.uint64(0xFFFFFFFF)
+        high = (hashes >> np.uint64(32)) | np.uint64(1)
+        steps = np.arange(self.hash_count, dtype=np.uint64)
+        return (low[:, None] + steps[None, :] * high[:, None]) % np.uint64(self.size)
+
+    def add_hashes(self, hashes):
+        positions = self._positions(hashes).ravel()
+        masks = np.left_shift(np.uint8(1), (positions & np.uint64(7)).astype(np.uint8))
+        np.bitwise_or.at(self.bits, (positions >> np.uint64(3)).astype(np.intp), masks)
+
+    def false_positive_rate(self, count):
+        """Chance that a hash never added is reported present, after adding count distinct hashes"""
+        return (1.0 - math.exp(-self.hash_count * count / self.size)) ** self.hash_count
+
+    def contains_hashes(self, hashes):
+        """Return a boolean array: True where the hash may have been added"""
+        positions = self._positions(hashes)
+        masks = np.left_shift(np.uint8(1), (positions & np.uint64(7)).astype(np.uint8))
+        return np.all(self.bits[(positions >> np.uint64(3)).astype(np.intp)] & masks, axis=1)
+
+
+# Expected values per column the report's Bloom filters are sized for when the
+# row count is unknown, and the cap when sizing from a row estimate (about 21 MB
+# per filter, 3-4 filters per column); beyond this the estimates drift upwards
+REPORT_BLOOM_CAPACITY = 5000000
+# Low enough that a column of millions of clean values expects well under one
+# false leak or collision
+REPORT_BLOOM_ERROR_RATE = 1e-7
+# Smallest filter capacity used when sizing from a row estimate
+MIN_REPORT_CAPACITY = 10000
+
+
+def estimate_rows(file_path, sample_rows=1000):
+    """Rough data row count of a file, or None if it cannot be told cheaply.
+
+    Uncompressed CSVs are estimated from the size of their first lines;
+    XLSX workbooks from the sheet dimensions. Compressed CSVs give None.
+    """
+    if data_suffix(file_path) == '.xlsx':
+        workbook = load_workbook(file_path, read_only=True)
+        try:
+            rows = [worksheet.max_row for worksheet in workbook.worksheets]
+        finally:
+            workbook.close()
+        return None if None in rows else sum(rows)
+    if detect_compression(file_path):
+        return None
+    with open(file_path, 'rb') as f:
+        f.readline()
+        sample = [len(line) for line, _ in zip(f, range(sample_rows))]
+    if not sample:
+        return 0
+    return int(os.path.getsize(file_path) * len(sample) / sum(sample))
+
+
+def report_capacity(rows=None):
+    """Bloom filter capacity for a report over about rows rows, capped at REPORT_BLOOM_CAPACITY"""
+    if rows is None:
+        return REPORT_BLOOM_CAPACITY
+    # Leave headroom for an estimate that comes in low
+    return min(REPORT_BLOOM_CAPACITY, max(MIN_REPORT_CAPACITY, int(rows * 1.25)))
+
+# Multiplier used to combine (original, masked) hashes into a pair hash
+_PAIR_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+class _ColumnStats:
+    """Running sketches for one masked column"""
+
+    def __init__(self, rule_type, capacity, error_rate, precision):
+        self.rule_type = rule_type
+        self.rows = 0
+        self.original_nulls = 0
+        self.masked_nulls = 0
+        self.null_mismatches = 0
+        self.unchanged_cells = 0
+        self.leaked_values = 0
+        self.hash_collisions = 0
+        self.original_distinct = HyperLogLog(precision)
+        self.masked_distinct = HyperLogLog(precision)
+        self.original_values = BloomFilter(capacity, error_rate)
+        self.masked_values = BloomFilter(capacity, error_rate)
+        self.leaked = BloomFilter(capacity, error_rate)
+        self.pairs = BloomFilter(capacity, error_rate) if rule_type == 'Hash (One-way)' else None
+
+
+class MaskingReport:
+    """One-pass quality and leakage report, fed chunk by chunk while masking.
+
+    Per masked column it tracks null preservation, approximate distinct
+    counts of the original and masked values (HyperLogLog), original values
+    showing up anywhere in the output (two Bloom filters, checked in both
+    directions so a value leaked before or after its source row is found,
+    and each leaked value counted once), and for 'Hash (One-way)' columns,
+    outputs shared by different originals. Memory is fixed by the sketch
+    sizes, not the data size; bloom_capacity should be at least the number
+    of distinct values per column (see report_capacity()).
+    """
+
+    def __init__(self, rules, bloom_capacity=REPORT_BLOOM_CAPACITY,
+                 bloom_error_rate=REPORT_BLOOM_ERROR_RATE, hll_precision=14):
+        self.rules = rules
+        self.bloom_capacity = bloom_capacity
+        self.bloom_error_rate = bloom_error_rate
+        self.hll_precision = hll_precision
+        self.columns = {}
+
+    def observe(self, original_chunk, masked_chunk):
+        """Update the sketches with one chunk and its masked counterpart"""
+        for field, rule in self.rules.items():
+            if field not in original_chunk.columns:
+                continue
+            stats = self.columns.get(field)
+            if stats is None:
+                stats = _ColumnStats(rule['type'], self.bloom_capacity, self.bloom_error_rate, self.hll_precision)
+                self.columns[field] = stats
+            self._observe_column(stats, original_chunk[field], masked_chunk[field])
+
+    def _observe_column(self, stats, original, masked):
+        original_null = original.isna().to_numpy()
+        masked_null = masked.isna().to_numpy()
+        stats.rows += len(original)
+        stats.original_nulls += int(original_null.sum())
+        stats.masked_nulls += int(masked_null.sum())
+        stats.null_mismatches += int(np.count_nonzero(original_null != masked_null))
+
+        both = ~original_null & ~masked_null
+        original_hashes = value_hashes(original[~original_null])
+        masked_hashes = value_hashes(masked[~masked_null])
+        stats.unchanged_cells += int(np.count_nonzero(
+            value_hashes(original[both]) == value_hashes(masked[both])
+        ))
+        stats.original_distinct.add_hashes(original_hashes)
+        stats.masked_distinct.add_hashes(masked_hashes)
+
+        # Leaks: output values matching any original so far (this chunk
+        # included), then originals matching output of earlier chunks.
+        # Values already counted as leaked are not counted again.
+        stats.original_values.add_hashes(original_hashes)
+        leaked = np.unique(np.concatenate([
+            masked_hashes[stats.original_values.contains_hashes(masked_hashes)],
+            original_hashes[stats.masked_values.contains_hashes(original_hashes)],
+        ]))
+        new_leaks = leaked[~stats.leaked.contains_hashes(leaked)]
+        stats.leaked_values += len(new_leaks)
+        stats.leaked.add_hashes(new_leaks)
+
+        if stats.pairs is not None:
+            pairs = pd.DataFrame({
+                'original': value_hashes(original[both]),
+                'masked': value_hashes(masked[both]),
+            }).drop_duplicates()
+            pair_hashes = (pairs['original'].to_numpy(dtype=np.uint64) * _PAIR_MULTIPLIER) ^ \
+                pairs['masked'].to_numpy(dtype=np.uint64)
+            new = ~stats.pairs.contains_hashes(pair_hashes)
+            new_masked = pairs['masked'].to_numpy(dtype=np.uint64)[new]
+            # A new pair collides if its output was already produced for another original
+            seen = stats.masked_values.contains_hashes(new_masked) | pd.Series(new_masked).duplicated().to_numpy()
+            stats.hash_collisions += int(np.count_nonzero(seen))
+            stats.pairs.add_hashes(pair_hashes[new])
+
+        stats.masked_values.add_hashes(masked_hashes)
+
+    def to_dict(self):
+        """Return the report as a JSON-serializable dict"""
+        columns = {}
+        warnings = []
+        for field, stats in self.columns.items():
+            distinct_original = stats.original_distinct.count()
+            distinct_masked = stats.masked_distinct.count()
+            if max(distinct_original, distinct_masked) > self.bloom_capacity:
+                warnings.append(
+                    f"{field}: about {max(distinct_original, distinct_masked)} distinct values exceed the "
+                    f"Bloom filter capacity of {self.bloom_capacity}; leak and collision counts are overstated"
+                    f" (raise --report-capacity)"
+                )
+            # False positives expected from the filters alone: each distinct output
+            # checked against the originals and each distinct original against the outputs
+            original_fp = stats.original_values.false_positive_rate(distinct_original)
+            masked_fp = stats.masked_values.false_positive_rate(distinct_masked)
+            entry = {
+                'rule': stats.rule_type,
+                'rows': stats.rows,
+                'original_nulls': stats.original_nulls,
+                'masked_nulls': stats.masked_nulls,
+                'null_mismatches': stats.null_mismatches,
+                'nulls_preserved': stats.null_mismatches == 0,
+                'distinct_original_est': distinct_original,
+                'distinct_masked_est': distinct_masked,
+                'unchanged_cells': stats.unchanged_cells,
+                'leaked_values_est': stats.leaked_values,
+                'leaked_values_expected_fp': distinct_masked * original_fp + distinct_original * masked_fp,
+            }
+            if stats.pairs is not None:
+                entry['hash_collisions_est'] = stats.hash_collisions
+                entry['hash_collisions_expected_fp'] = distinct_original * masked_fp
+                entry['hash_collision_rate_est'] = stats.hash_collisions / distinct_original if distinct_original else 0.0
+                # Birthday bound for the 16-hex-character (64-bit) truncated hash
+                entry['expected_hash_collision_rate'] = max(distinct_original - 1, 0) / 2.0 ** 64
+            columns[field] = entry
+        return {
+            'bloom_capacity': self.bloom_capacity,
+            'bloom_error_rate': self.bloom_error_rate,
+            'hll_precision': self.hll_precision,
+            'warnings': warnings,
+            'columns': columns,
+        }
+
+    def format_text(self):
+        """Return a human-readable summary of the report"""
+        report = self.to_dict()
+        lines = [f"WARNING: {warning}" for warning in report['warnings']]
+        if lines:
+            lines.append("")
+        for field, entry in report['columns'].items():
+            lines.append(f"Field: {field} ({entry['rule']})")
+            lines.append(f"  Rows: {entry['rows']}  Nulls: {entry['original_nulls']} -> {entry['masked_nulls']}"
+                         f"  {'preserved' if entry['nulls_preserved'] else 'NOT preserved'}")
+            lines.append(f"  Distinct (approx): {entry['distinct_original_est']} -> {entry['distinct_masked_est']}")
+            lines.append(f"  Unchanged cells: {entry['unchanged_cells']}  Leaked distinct values (approx):"
+                         f" {entry['leaked_values_est']} (false positives expected:"
+                         f" {entry['leaked_values_expected_fp']:.2g})")
+            if 'hash_collisions_est' in entry:
+                lines.append(f"  Hash collisions (approx): {entry['hash_collisions_est']}"
+                             f" (false positives expected: {entry['hash_collisions_expected_fp']:.2g};"
+                             f" rate {entry['hash_collision_rate_est']:.2e},"
+                             f" expected {entry['expected_hash_collision_rate']:.2e})")
+            lines.append("")
+        return "\n".join(lines) if lines else "No masked columns observed"
+
+    def save(self, file_path):
+        """Write the report as JSON"""
+        with open(file_path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+def mask_file(input_path, output_path, engine, chunksize=DEFAULT_CHUNK_ROWS, progress=None,
+              compression_level=None, io_engine='pandas', report=None):
+    """Mask a CSV (optionally compressed) or XLSX file chunk by chunk.
+
+    Reading the next chunk and compressing the previous one overlap with
+    masking, and free-text scrubbing in worker processes overlaps with
+    masking the next chunk. io_engine picks the CSV parser and writer. report, a
+    MaskingReport, is fed every chunk. progress, if given, is called as
+    progress(sheet_name, rows_done) after each chunk. Returns the total
+    number of data rows written.
+    """
+    check_sheet_output(input_path, output_path)
+    total_rows = 0
+    sheet_rows = {}
+    chunks = prefetch(iter_file_chunks(input_path, chunksize, io_engine))
+    try:
+        with open_chunk_writer(output_path, compression_level, io_engine) as writer:
+
+            def finish(sheet_name, chunk, result):
+                nonlocal total_rows
+                masked = result()
+                if report is not None:
+                    report.observe(chunk, masked)
+                writer.write_chunk(sheet_name, masked)
+                sheet_rows[sheet_name] = sheet_rows.get(sheet_name, 0) + len(chunk)
+                total_rows += len(chunk)
+                if progress is not None:
+                    progress(sheet_name, sheet_rows[sheet_name])
+
+            # One chunk stays in flight, so background scrubbing of a chunk
+            # overlaps with reading and masking the next one
+            pending = None
+            for sheet_name, chunk in chunks:
+                submitted = (sheet_name, chunk, engine.submit_chunk(chunk))
+                if pending is not None:
+                    finish(*pending)
+                pending = submitted
+            if pending is not None:
+                finish(*pending)
+    finally:
+        # Stops the reader thread if masking or writing failed part way
+        chunks.close()
+    return total_rows
+
+
+def ordered_parallel_map(func, items, workers=1, initializer=None, initargs=()):
+    """Map func over items in worker processes, yielding results in order.
+
+    At most two items per worker are in flight, so a large input is never
+    materialized. With workers <= 1 everything runs in the calling process.
+    """
+    if workers <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        yield from map(func, items)
+        return
+    window = workers * 2
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+class ReverseMappingStore:
+    """SQLite-backed reverse mapping (field, masked value) -> original value.
+
+    Lookups are batched per chunk, so unmasking never loads the whole mapping
+    into memory. Each thread or process opens its own connection.
+    """
+
+    # Stay well below SQLite's bound-parameter limit
+    LOOKUP_BATCH = 500
+
+    def __init__(self, db_path):
+        self.db_path = str(db_path)
+        self._local = threading.local()
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS mapping ("
+            "field TEXT NOT NULL, masked TEXT NOT NULL, original TEXT, "
+            "PRIMARY KEY (field, masked)) WITHOUT ROWID"
+        )
+        self.connection.commit()
+
+    @property
+    def connection(self):
+        conn = getattr(self._local, 'connection', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path)
+            self._local.connection = conn
+        return conn
+
+    @classmethod
+    def from_json(cls, json_path, db_path):
+        """Build a store from a JSON file written by 'Export Reverse Mapping'"""
+        with open(json_path, 'r') as f:
+            mapping = json.load(f)
+        store = cls(db_path)
+        store.add_mapping(mapping)
+        return store
+
+    def add_mapping(self, mapping):
+        """Insert a {field: {masked: original}} mapping"""
+        conn = self.connection
+        for field, values in mapping.items():
+            conn.executemany(
+                "INSERT OR REPLACE INTO mapping (field, masked, original) VALUES (?, ?, ?)",
+                ((field, masked, original) for masked, original in values.items())
+            )
+        conn.commit()
+
+    def fields(self):
+        """Return the fields that have stored mappings"""
+        return [row[0] for row in self.connection.execute("SELECT DISTINCT field FROM mapping")]
+
+    def lookup(self, field, masked_values):
+        """Return {masked: original} for the masked values found in the store"""
+        masked_values = list(masked_values)
+        found = {}
+        for start in range(0, len(masked_values), self.LOOKUP_BATCH):
+            batch = masked_values[start:start + self.LOOKUP_BATCH]
+            placeholders = ','.join('?' * len(batch))
+            rows = self.connection.execute(
+                f"SELECT masked, original FROM mapping WHERE field = ? AND masked IN ({placeholders})",
+                [field, *batch]
+            )
+            found.update(rows)
+        return found
+
+    def close(self):
+        conn = getattr(self._local, 'connection', None)
+        if conn is not None:
+            conn.close()
+            self._local.connection = None
+
+
+def store_for_json(json_path):
+    """Return (db_path, temporary) for a JSON file from 'Export Reverse Mapping'.
+
+    The store is cached as <name>.db next to the JSON and rebuilt whenever
+    the JSON is newer. If that directory is not writable, the store is built
+    in the temp directory and temporary is True; the caller deletes it.
+    """
+    json_path = Path(json_path)
+    db_path = json_path.with_suffix('.db')
+    if db_path.exists() and db_path.stat().st_mtime > json_path.stat().st_mtime:
+        return str(db_path), False
+    try:
+        fd, temp_path = tempfile.mkstemp(suffix='.db', dir=json_path.parent)
+        cached = True
+    except OSError:
+        fd, temp_path = tempfile.mkstemp(suffix='.db')
+        cached = False
+    os.close(fd)
+    try:
+        ReverseMappingStore.from_json(json_path, temp_path).close()
+        if cached:
+            # Built aside and moved into place, so a concurrent reader never sees half a store
+            os.replace(temp_path, db_path)
+    except BaseException:
+        Path(temp_path).unlink(missing_ok=True)
+        raise
+    return (str(db_path), False) if cached else (temp_path, True)
+
+
+def decrypt_token(cipher, value_str, masking_type):
+    """Decrypt one masked value produced by a reversible rule.
+
+    Raises InvalidToken if the value is not a token of this key.
+    """
+    token = value_str.encode()
+    if masking_type == 'Format-Preserving Encryption':
+        try:
+            token = base64.urlsafe_b64decode(token)
+        except ValueError:
+            raise InvalidToken
+    return cipher.decrypt(token).decode()
+
+
+class Unmasker:
+    """Restores original values of reversible columns, chunk by chunk.
+
+    Columns whose rule carries a key are decrypted directly; other columns
+    are resolved through the reverse-mapping store. Each chunk is reduced to
+    its distinct values before decrypting or looking up, then mapped back.
+    Values that do not decrypt with the rule key (wrong key, not a token)
+    are left masked and counted per field in self.skipped.
+    """
+
+    def __init__(self, rules=None, store_path=None):
+        self.ciphers = {}
+        for field, rule in (rules or {}).items():
+            key = rule.get('options', {}).get('key')
+            if rule.get('type') in REVERSIBLE_TYPES and key:
+                self.ciphers[field] = (Fernet(key.encode()), rule['type'])
+        self.store = ReverseMappingStore(store_path) if store_path else None
+        self.store_fields = set(self.store.fields()) if self.store else set()
+        self.skipped = {}
+
+    def fields(self):
+        """Return the fields this unmasker can restore"""
+        return set(self.ciphers) | self.store_fields
+
+    def unmask_series(self, series, field):
+        values = series.dropna().astype(str)
+        distinct = values[values != ''].unique()
+        if field in self.ciphers:
+            cipher, masking_type = self.ciphers[field]
+            restored = {}
+            failed = []
+            for v in distinct:
+                try:
+                    restored[v] = decrypt_token(cipher, v, masking_type)
+                except InvalidToken:
+                    failed.append(v)
+            if failed:
+                count = int(values.isin(failed).sum())
+                self.skipped[field] = self.skipped.get(field, 0) + count
+        else:
+            restored = self.store.lookup(field, distinct)
+        if not restored:
+            return series
+        return series.map(lambda x: restored.get(x, x) if isinstance(x, str) else x)
+
+    def unmask_chunk(self, chunk):
+        """Return a copy of chunk with every restorable column unmasked"""
+        restored = chunk.copy()
+        for field in self.fields():
+            if field in restored.columns:
+                restored[field] = self.unmask_series(restored[field], field)
+        return restored
+
+
+# Per-process state for parallel unmasking
+_unmask_state = {}
+
+
+def _init_unmask_worker(rules, store_path):
+    _unmask_state['unmasker'] = Unmasker(rules, store_path)
+
+
+def _unmask_worker(item):
+    sheet_name, chunk = item
+    unmasker = _unmask_state['unmasker']
+    unmasker.skipped = {}
+    return sheet_name, unmasker.unmask_chunk(chunk), unmasker.skipped
+
+
+def unmask_file(input_path, output_path, rules=None, store_path=None,
+                chunksize=DEFAULT_CHUNK_ROWS, workers=1, progress=None, io_engine='pandas', skipped=None):
+    """Re-identify a masked CSV or XLSX file in parallel batches.
+
+    rules is a rule set as saved by 'Export Rules'; reversible columns with a
+    key are decrypted directly. store_path points to a ReverseMappingStore
+    used for the remaining columns. skipped, if given, is a dict updated with
+    the number of cells per field left masked because they did not decrypt.
+    Returns the number of rows written.
+    """
+    if store_path and not Path(store_path).exists():
+        raise FileNotFoundError(f"Reverse mapping store not found: {store_path}")
+    if not Unmasker(rules, store_path).fields():
+        raise ValueError("No reversible rules with a key and no reverse mapping store given")
+    check_sheet_output(input_path, output_path)
+    chunks = iter_file_chunks(input_path, chunksize, io_engine, dtype=str)
+    total_rows = 0
+    with open_chunk_writer(output_path, io_engine=io_engine) as writer:
+        for sheet_name, chunk, chunk_skipped in ordered_parallel_map(_unmask_worker, chunks, workers,
+                                                                     _init_unmask_worker, (rules, store_path)):
+            if skipped is not None:
+                for field, count in chunk_skipped.items():
+                    skipped[field] = skipped.get(field, 0) + count
+            writer.write_chunk(sheet_name, chunk)
+            total_rows += len(chunk)
+            if progress is not None:
+                progress(sheet_name, total_rows)
+    return total_rows
+
+
+def load_rule_sets(rules_path):
+    """Load rule sets from a JSON file or a directory of JSON files.
+
+    Each rule set is named after its file stem.
+    """
+    rules_path = Path(rules_path)
+    files = sorted(rules_path.glob('*.json')) if rules_path.is_dir() else [rules_path]
+    rule_sets = {}
+    for file_path in files:
+        with open(file_path, 'r') as f:
+            rule_sets[file_path.stem] = json.load(f)
+    if not rule_sets:
+        raise ValueError(f"No rule sets found in {rules_path}")
+    return rule_sets
+
+
+# Largest request body the masking service accepts
+MAX_REQUEST_BYTES = 64 * 1024 * 1024
+
+NDJSON_TYPE = 'application/x-ndjson'
+ARROW_STREAM_TYPE = 'application/vnd.apache.arrow.stream'
+
+# Warm engines of the current service process, keyed by rule set name
+_service_engines = {}
+
+
+def _init_service_worker(rule_sets, fake_pool_size):
+    _service_engines.clear()
+    for name, rules in rule_sets.items():
+        _service_engines[name] = MaskingEngine(
+            rules, track_reverse_mapping=False, fake_pool_size=fake_pool_size
+        ).warm()
+
+
+def _service_mask(rule_set, body, content_type):
+    """Mask one request body with a warm engine; returns (payload, content_type)"""
+    engine = _service_engines[rule_set]
+    if content_type == ARROW_STREAM_TYPE:
+        if pa is None:
+            raise ValueError("Arrow requests need pyarrow installed")
+        chunk = pa.ipc.open_stream(body).read_all().to_pandas()
+        table = pa.Table.from_pandas(engine.mask_chunk(chunk), preserve_index=False)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as stream:
+            stream.write_table(table)
+        return sink.getvalue().to_pybytes(), ARROW_STREAM_TYPE
+    records = [json.loads(line) for line in body.splitlines() if line.strip()]
+    if not records:
+        return b'', NDJSON_TYPE
+    masked = engine.mask_chunk(pd.DataFrame.from_records(records))
+    payload = masked.to_json(orient='records', lines=True, date_format='iso')
+    return payload.encode('utf-8'), NDJSON_TYPE
+
+
+class MaskingService:
+    """Long-running masking daemon speaking a small subset of HTTP/1.1.
+
+    Rule sets are loaded once and kept as warm engines (ciphers and fake-value
+    pools built up front) in every worker. Requests:
+
+        GET  /health            -> {"status": "ok", "rule_sets": [...]}
+        POST /mask/<rule set>   -> masked records
+
+    Bodies are JSON lines, or Arrow IPC streams when sent with the
+    application/vnd.apache.arrow.stream content type. Masking runs in a
+    process pool; with workers <= 1 it runs on a thread of this process.
+    """
+
+    def __init__(self, rule_sets, workers=1, fake_pool_size=1000):
+        self.rule_sets = rule_sets
+        self.workers = workers
+        self.fake_pool_size = fake_pool_size
+        self.executor = None
+
+    def start_pool(self):
+        if self.workers > 1:
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_init_service_worker,
+                initargs=(self.rule_sets, self.fake_pool_size)
+            )
+            # Start every worker now so the first requests do not pay for it
+            list(self.executor.map(abs, range(self.workers)))
+        else:
+            _init_service_worker(self.rule_sets, self.fake_pool_size)
+            self.executor = ThreadPoolExecutor(max_workers=1)
+
+    async def dispatch(self, method, target, headers, body):
+        """Route a request; returns (status, content_type, payload)"""
+        path = target.split('?', 1)[0]
+        if method == 'GET' and path == '/health':
+            payload = json.dumps({'status': 'ok', 'rule_sets': sorted(self.rule_sets)})
+            return '200 OK', 'application/json', payload.encode()
+        if method == 'POST' and path.startswith('/mask/'):
+            rule_set = path[len('/mask/'):]
+            if rule_set not in self.rule_sets:
+                return '404 Not Found', 'text/plain', f"Unknown rule set: {rule_set}".encode()
+            content_type = headers.get('content-type', NDJSON_TYPE).split(';', 1)[0].strip()
+            loop = asyncio.get_running_loop()
+            try:
+                payload, content_type = await loop.run_in_executor(
+                    self.executor, _service_mask, rule_set, body, content_type
+                )
+            except (ValueError, TypeError) as e:
+                # Undecodable bodies and values the rules cannot handle
+                return '400 Bad Request', 'text/plain', f"Masking failed: {str(e)}".encode()
+            except Exception as e:
+                # Server-side faults such as a broken worker pool
+                return '500 Internal Server Error', 'text/plain', f"Internal error: {str(e)}".encode()
+            return '200 OK', content_type, payload
+        return '404 Not Found', 'text/plain', b"Not found"
+
+    async def handle_connection(self, reader, writer):
+        """Serve requests on one connection until the client closes it"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self._respond(writer, '400 Bad Request', 'text/plain', b"Bad request", False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                transfer_encoding = headers.get('transfer-encoding', '').lower()
+                if transfer_encoding and transfer_encoding != 'chunked':
+                    await self._respond(writer, '501 Not Implemented', 'text/plain',
+                                        b"Only chunked transfer encoding is supported", False)
+                    break
+                try:
+                    length = int(headers.get('content-length', 0) or 0)
+                except ValueError:
+                    await self._respond(writer, '400 Bad Request', 'text/plain', b"Bad Content-Length", False)
+                    break
+                if length > MAX_REQUEST_BYTES:
+                    await self._respond(writer, '413 Payload Too Large', 'text/plain', b"Request too large", False)
+                    break
+                if headers.get('expect', '').lower() == '100-continue':
+                    # Clients such as curl wait for this before sending large bodies
+                    writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+                    await writer.drain()
+                if transfer_encoding:
+                    try:
+                        body = await self._read_chunked(reader)
+                    except ValueError:
+                        await self._respond(writer, '400 Bad Request', 'text/plain', b"Malformed chunked body", False)
+                        break
+                    if body is None:
+                        await self._respond(writer, '413 Payload Too Large', 'text/plain', b"Request too large", False)
+                        break
+                else:
+                    body = await reader.readexactly(length) if length else b''
+                status, content_type, payload = await self.dispatch(method, target, headers, body)
+                await self._respond(writer, status, content_type, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_chunked(self, reader):
+        """Read a chunked request body; returns None if it exceeds MAX_REQUEST_BYTES"""
+        parts = []
+        size = 0
+        while True:
+            # Chunk extensions after ';' are ignored
+            chunk_size = int((await reader.readline()).split(b';', 1)[0].strip(), 16)
+            if chunk_size == 0:
+                break
+            size += chunk_size
+            if size > MAX_REQUEST_BYTES:
+                return None
+            parts.append(await reader.readexactly(chunk_size))
+            if await reader.readexactly(2) != b'\r\n':
+                raise ValueError("Chunk is not terminated by CRLF")
+        # Skip trailer fields up to the blank line ending the body
+        while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass
+        return b''.join(parts)
+
+    async def _respond(self, writer, status, content_type, payload, keep_alive):
+        head = (
+            f"HTTP/1.1 {status}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode('latin-1') + payload)
+        await writer.drain()
+
+    async def serve(self, host='127.0.0.1', port=8765, socket_path=None, ready=None):
+        """Run until cancelled; ready, if given, is called with the server once listening"""
+        self.start_pool()
+        try:
+            if socket_path:
+                server = await asyncio.start_unix_server(self.handle_connection, path=socket_path)
+            else:
+                server = await asyncio.start_server(self.handle_connection, host, port)
+            async with server:
+                if ready is not None:
+                    ready(server)
+                await server.serve_forever()
+        finally:
+            self.executor.shutdown(cancel_futures=True)
+
+
+# Default target size of a byte-range shard
+DEFAULT_SHARD_BYTES = 256 * 1024 * 1024
+
+# A claimed shard whose claim file has not been touched for this long is
+# considered abandoned and handed to another worker
+SHARD_LEASE_SECONDS = 120
+
+MANIFEST_NAME = 'manifest.json'
+
+
+def csv_byte_ranges(file_path, shard_bytes=DEFAULT_SHARD_BYTES):
+    """Split an uncompressed CSV into line-aligned byte ranges after the header.
+
+    Returns (header_bytes, [(start, end), ...]). A file with only a header
+    gives one empty range, so its shard still writes the header. Fields with
+    embedded line breaks must not straddle a boundary, so files with
+    multi-line quoted values should be sharded per file instead.
+    """
+    size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as f:
+        header = f.readline()
+        offsets = [f.tell()]
+        while offsets[-1] < size:
+            target = offsets[-1] + shard_bytes
+            if target >= size:
+                offsets.append(size)
+                break
+            # The line containing the target belongs to the current shard
+            f.seek(target)
+            f.readline()
+            offsets.append(f.tell())
+    return header, list(zip(offsets, offsets[1:])) or [(offsets[0], offsets[0])]
+
+
+def plan_shards(input_path, rules_path, work_dir, output_path=None,
+                shard_bytes=DEFAULT_SHARD_BYTES, mask_key=None):
+    """Split an input file or directory into shards and write the shard manifest.
+
+    An uncompressed CSV is split into byte ranges; compressed CSVs and
+    workbooks are one shard each. A directory gives one shard per data file.
+    Byte-range shards are written as CSV parts and merged into output_path;
+    whole-file shards keep their file name and format under work_dir/parts.
+    mask_key (random if not given) keys the deterministic fake and randomized
+    values, so the same original gets the same masked value in every shard.
+    Returns the manifest path.
+    """
+    input_path = Path(input_path).resolve()
+    work_dir = Path(work_dir).resolve()
+    parts_dir = work_dir / 'parts'
+    parts_dir.mkdir(parents=True, exist_ok=True)
+
+    if input_path.is_dir():
+        files = sorted(p for p in input_path.iterdir()
+                       if p.is_file() and data_suffix(p) in ('.csv', '.xlsx'))
+    else:
+        files = [input_path]
+    if not files:
+        raise ValueError(f"No CSV or XLSX files found in {input_path}")
+
+    shards = []
+    for file_path in files:
+        if data_suffix(file_path) == '.csv' and not detect_compression(file_path):
+            header, ranges = csv_byte_ranges(file_path, shard_bytes)
+            for start, end in ranges:
+                index = len(shards)
+                shards.append({
+                    'id': f'shard-{index:05d}', 'index': index, 'path': str(file_path),
+                    'start': start, 'end': end, 'header': header.decode('utf-8'),
+                    'output': str(parts_dir / f'{file_path.stem}.part-{index:05d}.csv'),
+                })
+        else:
+            index = len(shards)
+            shards.append({
+                'id': f'shard-{index:05d}', 'index': index, 'path': str(file_path),
+                'output': str(parts_dir / file_path.name),
+            })
+
+    if output_path and any(data_suffix(shard['output']) != '.csv' for shard in shards):
+        raise ValueError("Only CSV shards can be merged into a single output file")
+
+    manifest = {
+        'version': 1,
+        'input': str(input_path),
+        'rules': str(Path(rules_path).resolve()),
+        'output': str(Path(output_path).resolve()) if output_path else None,
+        'mask_key': mask_key or os.urandom(16).hex(),
+        'shards': shards,
+    }
+    manifest_path = work_dir / MANIFEST_NAME
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return str(manifest_path)
+
+
+class _ByteRangeReader(io.RawIOBase):
+    """Readable stream of a header followed by a byte range of a file"""
+
+    def __init__(self, file_path, start, end, header):
+        self._file = open(file_path, 'rb')
+        self._file.seek(start)
+        self._remaining = end - start
+        self._prefix = header
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._prefix:
+            n = min(len(buffer), len(self._prefix))
+            buffer[:n] = self._prefix[:n]
+            self._prefix = self._prefix[n:]
+            return n
+        if self._remaining <= 0:
+            return 0
+        data = self._file.read(min(len(buffer), self._remaining))
+        n = len(data)
+        buffer[:n] = data
+        self._remaining -= n
+        return n
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def iter_shard_chunks(shard, chunksize=DEFAULT_CHUNK_ROWS, io_engine='pandas'):
+    """Stream one shard as (sheet_name, DataFrame) chunks"""
+    if 'start' not in shard:
+        yield from iter_file_chunks(shard['path'], chunksize, io_engine)
+        return
+    reader = _ByteRangeReader(shard['path'], shard['start'], shard['end'], shard['header'].encode('utf-8'))
+    with io.BufferedReader(reader) as handle:
+        with pd.read_csv(handle, chunksize=chunksize) as chunks:
+            for chunk in chunks:
+                yield None, chunk
+
+
+class ShardClaimLost(Exception):
+    """Raised when a worker's expired claim was handed to another worker"""
+
+
+class ShardState:
+    """Shard status files kept next to the manifest on the shared filesystem.
+
+    <id>.claim is created exclusively by the worker that takes a shard,
+    holds its worker id and is touched after every chunk as a heartbeat;
+    <id>.done and <id>.failed record the outcome. Only the worker named in
+    the claim may heartbeat, complete or fail the shard.
+    """
+
+    def __init__(self, manifest_path):
+        self.dir = Path(manifest_path).resolve().parent
+
+    def _path(self, shard, kind):
+        return self.dir / f"{shard['id']}.{kind}"
+
+    def claim(self, shard, worker_id):
+        """Atomically claim a shard; returns False if another worker has it"""
+        try:
+            fd = os.open(self._path(shard, 'claim'), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'w') as f:
+            f.write(worker_id)
+        return True
+
+    def owner(self, shard):
+        """Return the worker id holding the claim, or None"""
+        try:
+            return self._path(shard, 'claim').read_text()
+        except FileNotFoundError:
+            return None
+
+    def heartbeat(self, shard, worker_id):
+        """Refresh a claim; raises ShardClaimLost if worker_id no longer holds it"""
+        if self.owner(shard) != worker_id:
+            raise ShardClaimLost(shard['id'])
+        os.utime(self._path(shard, 'claim'))
+
+    def mark_done(self, shard, worker_id, info):
+        self.heartbeat(shard, worker_id)
+        with open(self._path(shard, 'done'), 'w') as f:
+            json.dump(info, f)
+
+    def mark_failed(self, shard, worker_id, error):
+        """Record a failure and release the claim, unless it was handed over"""
+        if self.owner(shard) != worker_id:
+            return
+        with open(self._path(shard, 'failed'), 'w') as f:
+            f.write(error)
+        self._path(shard, 'claim').unlink(missing_ok=True)
+
+    def status(self, shard):
+        """Return 'done', 'failed', 'running', 'stale' or 'pending'"""
+        if self._path(shard, 'done').exists():
+            return 'done'
+        if self._path(shard, 'failed').exists():
+            return 'failed'
+        try:
+            age = time.time() - self._path(shard, 'claim').stat().st_mtime
+        except FileNotFoundError:
+            return 'pending'
+        return 'running' if age < SHARD_LEASE_SECONDS else 'stale'
+
+    def failure(self, shard):
+        try:
+            return self._path(shard, 'failed').read_text()
+        except FileNotFoundError:
+            return "claim expired"
+
+    def reset(self, shard):
+        """Make a failed or abandoned shard claimable again"""
+        for kind in ('claim', 'failed'):
+            self._path(shard, kind).unlink(missing_ok=True)
+
+    def rows(self, shard):
+        with open(self._path(shard, 'done'), 'r') as f:
+            return json.load(f)['rows']
+
+
+def load_manifest(manifest_path):
+    with open(manifest_path, 'r') as f:
+        return json.load(f)
+
+
+def mask_shard(manifest, shard, state, worker_id, chunksize=DEFAULT_CHUNK_ROWS, io_engine='pandas'):
+    """Mask one shard into its part file; returns the number of rows written.
+
+    The part is written to a temporary file private to this worker and moved
+    into place only while the worker still holds the claim.
+    """
+    with open(manifest['rules'], 'r') as f:
+        rules = json.load(f)
+    engine = MaskingEngine(rules, track_reverse_mapping=False, deterministic_key=manifest['mask_key'])
+    output = Path(shard['output'])
+    # Keep the format and compression suffixes so the writer picks the same encoding
+    suffix = data_suffix(output) + (output.suffix if detect_compression(output) else '')
+    worker_tag = re.sub(r'[^\w.-]', '_', worker_id)
+    temp_output = output.with_name(f".{output.name}.{worker_tag}.tmp{suffix}")
+    total_rows = 0
+    try:
+        with open_chunk_writer(temp_output, io_engine=io_engine) as writer:
+            for sheet_name, chunk in iter_shard_chunks(shard, chunksize, io_engine):
+                writer.write_chunk(sheet_name, engine.mask_chunk(chunk))
+                total_rows += len(chunk)
+                state.heartbeat(shard, worker_id)
+        state.heartbeat(shard, worker_id)
+        os.replace(temp_output, output)
+    finally:
+        engine.close()
+        temp_output.unlink(missing_ok=True)
+    return total_rows
+
+
+def run_shard_worker(manifest_path, worker_id=None, chunksize=DEFAULT_CHUNK_ROWS, io_engine='pandas'):
+    """Claim and mask shards until none are left; returns the number of failures.
+
+    Any number of workers, on this host or others sharing the filesystem,
+    can run against the same manifest.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    manifest = load_manifest(manifest_path)
+    state = ShardState(manifest_path)
+    failures = 0
+    for shard in manifest['shards']:
+        if state.status(shard) != 'pending' or not state.claim(shard, worker_id):
+            continue
+        started = time.time()
+        try:
+            rows = mask_shard(manifest, shard, state, worker_id, chunksize, io_engine)
+            state.mark_done(shard, worker_id,
+                            {'rows': rows, 'worker': worker_id, 'seconds': round(time.time() - started, 3)})
+        except ShardClaimLost:
+            # The claim expired and another worker owns the shard now
+            continue
+        except Exception as e:
+            state.mark_failed(shard, worker_id, f"{worker_id}: {str(e)}")
+            failures += 1
+    return failures
+
+
+def commit_shards(manifest_path, compression_level=None):
+    """Merge CSV parts into the final output (if any) and write the _SUCCESS marker.
+
+    Parts are decompressed as they are read; every part must have the same
+    header, which is written once.
+    """
+    manifest = load_manifest(manifest_path)
+    state = ShardState(manifest_path)
+    total_rows = sum(state.rows(shard) for shard in manifest['shards'])
+    if manifest['output']:
+        first_header = None
+        with open_binary_output(manifest['output'], compression_level) as out:
+            for shard in manifest['shards']:
+                with open_binary_input(shard['output']) as part:
+                    header = part.readline()
+                    if not header:
+                        continue
+                    if first_header is None:
+                        first_header = header
+                        out.write(header)
+                    elif header != first_header:
+                        raise ValueError(f"{shard['output']} has different columns than the first part")
+                    while True:
+                        block = part.read(8 * 1024 * 1024)
+                        if not block:
+                            break
+                        out.write(block)
+    with open(Path(manifest_path).parent / '_SUCCESS', 'w') as f:
+        json.dump({'rows': total_rows, 'shards': len(manifest['shards']), 'output': manifest['output']}, f)
+    return total_rows
+
+
+def coordinate_shards(manifest_path, workers=2, max_attempts=3, chunksize=DEFAULT_CHUNK_ROWS,
+                      io_engine='pandas', compression_level=None, poll_seconds=1.0, log=print):
+    """Run local worker processes over a manifest, retry failures, then commit.
+
+    Shards still being worked on by other hosts (fresh claims) are waited
+    for; failed shards and claims whose lease expired are reset and retried
+    up to max_attempts times. Returns the total number of rows.
+    """
+    manifest = load_manifest(manifest_path)
+    state = ShardState(manifest_path)
+    attempts = {shard['id']: 0 for shard in manifest['shards']}
+    script = os.path.abspath(__file__)
+    while True:
+        statuses = {shard['id']: state.status(shard) for shard in manifest['shards']}
+        if all(status == 'done' for status in statuses.values()):
+            break
+        for shard in manifest['shards']:
+            if statuses[shard['id']] in ('failed', 'stale'):
+                attempts[shard['id']] += 1
+                reason = state.failure(shard)
+                if attempts[shard['id']] >= max_attempts:
+                    raise RuntimeError(f"{shard['id']} failed {attempts[shard['id']]} times: {reason}")
+                log(f"Retrying {shard['id']} ({reason})")
+                state.reset(shard)
+                statuses[shard['id']] = 'pending'
+        pending = sum(1 for status in statuses.values() if status == 'pending')
+        if pending and workers > 0:
+            command = [sys.executable, script, 'worker', str(manifest_path),
+                       '--chunksize', str(chunksize), '--io-engine', io_engine]
+            processes = [
+                subprocess.Popen(command + ['--worker-id', f"{socket.gethostname()}-local{i}"])
+                for i in range(min(workers, pending))
+            ]
+            for process in processes:
+                process.wait()
+        else:
+            time.sleep(poll_seconds)
+    total_rows = commit_shards(manifest_path, compression_level)
+    log(f"Committed {len(manifest['shards'])} shards, {total_rows} rows")
+    return total_rows
+
+
+# File dialog filters for data files
+COMPRESSED_CSV_TYPE = ("Compressed CSV", "*.csv.gz *.csv.bz2 *.csv.zst")
+DATA_FILE_TYPES = [("CSV files", "*.csv"), COMPRESSED_CSV_TYPE, ("Excel files", "*.xlsx"), ("All files", "*.*")]
+
 
 class DataMaskingTool:
     def __init__(self, root):
@@ -27,6 +2079,7 @@ class DataMaskingTool:
         # Data storage
         self.df = None
         self.masked_df = None
+        self.report = None  # Verification report of the last masking run
         self.masking_rules = {}
         self.encryption_key = None
         self.reverse_mapping = {}  # For reversible masking
@@ -46,6 +2099,8 @@ class DataMaskingTool:
         file_menu.add_command(label="Load Excel", command=self.load_excel)
         file_menu.add_separator()
         file_menu.add_command(label="Save Masked Data", command=self.save_masked_data)
+        file_menu.add_command(label="Mask Large File...", command=self.mask_large_file)
+        file_menu.add_command(label="Unmask File...", command=self.unmask_file)
         file_menu.add_command(label="Export Rules", command=self.export_rules)
         file_menu.add_command(label="Import Rules", command=self.import_rules)
         file_menu.add_separator()
@@ -141,7 +2196,8 @@ class DataMaskingTool:
             'Phone Masking',
             'SSN Masking',
             'Date Shifting',
-            'Number Randomization'
+            'Number Randomization',
+            'Free-Text Scrubbing'
         ]
         self.masking_type.current(0)
         self.masking_type.bind('<<ComboboxSelected>>', self.on_masking_type_change)
@@ -177,6 +2233,16 @@ class DataMaskingTool:
         self.date_shift.grid(row=0, column=1, padx=5, pady=2)
         self.date_shift.set(30)
         
+        # Free-text scrubbing options
+        self.scrub_frame = ttk.Frame(self.options_frame)
+        ttk.Label(self.scrub_frame, text="Replacement:").grid(row=0, column=0, sticky=tk.W, padx=5, pady=2)
+        self.scrub_strategy = ttk.Combobox(self.scrub_frame, state='readonly', width=10, values=SCRUB_STRATEGIES)
+        self.scrub_strategy.grid(row=0, column=1, sticky=tk.W, padx=5, pady=2)
+        self.scrub_strategy.current(0)
+        ttk.Label(self.scrub_frame, text="Extra terms (comma-separated):").grid(row=1, column=0, sticky=tk.W, padx=5, pady=2)
+        self.scrub_terms = ttk.Entry(self.scrub_frame, width=40)
+        self.scrub_terms.grid(row=1, column=1, padx=5, pady=2)
+        
         # Buttons
         button_frame = ttk.Frame(right_frame)
         button_frame.grid(row=2, column=0, columnspan=2, pady=10)
@@ -206,6 +2272,12 @@ class DataMaskingTool:
         self.batch_size.pack(anchor=tk.W, padx=5, pady=5)
         self.batch_size.set(1000)
         
+        ttk.Label(options_frame, text="CSV I/O Engine:").pack(anchor=tk.W, padx=5)
+        self.io_engine = ttk.Combobox(options_frame, state='readonly', width=12,
+                                      values=IO_ENGINES if pa is not None else IO_ENGINES[:1])
+        self.io_engine.pack(anchor=tk.W, padx=5, pady=5)
+        self.io_engine.current(0)
+        
         # Processing button
         ttk.Button(options_frame, text="Apply Masking Rules", command=self.apply_masking, 
                   style='Accent.TButton').pack(pady=10)
@@ -230,6 +2302,7 @@ class DataMaskingTool:
         ttk.Button(control_frame, text="Save Masked Data", command=self.save_masked_data).pack(side=tk.LEFT, padx=5)
         ttk.Button(control_frame, text="Export Reverse Mapping", command=self.export_reverse_mapping).pack(side=tk.LEFT, padx=5)
         ttk.Button(control_frame, text="Compare Original vs Masked", command=self.show_comparison).pack(side=tk.LEFT, padx=5)
+        ttk.Button(control_frame, text="Verification Report", command=self.show_report).pack(side=tk.LEFT, padx=5)
         
         # Results display
         results_frame = ttk.LabelFrame(self.results_tab, text="Masked Data Preview")
@@ -254,11 +2327,11 @@ class DataMaskingTool:
         """Load CSV file"""
         file_path = filedialog.askopenfilename(
             title="Select CSV File",
-            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
+            filetypes=[("CSV files", "*.csv"), COMPRESSED_CSV_TYPE, ("All files", "*.*")]
         )
         if file_path:
             try:
-                self.df = pd.read_csv(file_path)
+                self.df = read_csv_file(file_path, self.io_engine.get())
                 self.update_data_view()
                 self.update_status(f"Loaded: {Path(file_path).name} ({len(self.df)} rows)")
                 messagebox.showinfo("Success", f"Loaded {len(self.df)} rows successfully!")
@@ -273,7 +2346,10 @@ class DataMaskingTool:
         )
         if file_path:
             try:
-                self.df = pd.read_excel(file_path)
+                if file_path.lower().endswith('.xls'):
+                    self.df = pd.read_excel(file_path)
+                else:
+                    self.df = read_excel_sheet(file_path)
                 self.update_data_view()
                 self.update_status(f"Loaded: {Path(file_path).name} ({len(self.df)} rows)")
                 messagebox.showinfo("Success", f"Loaded {len(self.df)} rows successfully!")
@@ -326,6 +2402,7 @@ class DataMaskingTool:
         self.partial_frame.grid_remove()
         self.reversible_frame.grid_remove()
         self.date_frame.grid_remove()
+        self.scrub_frame.grid_remove()
         
         # Show relevant frame
         masking_type = self.masking_type.get()
@@ -335,6 +2412,8 @@ class DataMaskingTool:
             self.reversible_frame.grid(row=0, column=0, sticky=tk.W)
         elif masking_type == 'Date Shifting':
             self.date_frame.grid(row=0, column=0, sticky=tk.W)
+        elif masking_type == 'Free-Text Scrubbing':
+            self.scrub_frame.grid(row=0, column=0, sticky=tk.W)
             
     def generate_key(self):
         """Generate encryption key"""
@@ -373,6 +2452,10 @@ class DataMaskingTool:
                 rule['options']['key'] = key
             elif masking_type == 'Date Shifting':
                 rule['options']['shift_days'] = int(self.date_shift.get())
+            elif masking_type == 'Free-Text Scrubbing':
+                rule['options']['patterns'] = list(PII_PATTERNS)
+                rule['options']['default_strategy'] = self.scrub_strategy.get()
+                rule['options']['terms'] = [t.strip() for t in self.scrub_terms.get().split(',') if t.strip()]
                 
             self.masking_rules[field] = rule
             
@@ -424,18 +2507,19 @@ class DataMaskingTool:
             messagebox.showwarning("Warning", "Please define masking rules first")
             return
             
+        engine = self.create_engine()
         try:
             self.log("Starting masking process...")
             self.masked_df = self.df.copy()
             total_fields = len(self.masking_rules)
             
-            for idx, (field, rule) in enumerate(self.masking_rules.items()):
+            for idx, field in enumerate(self.masking_rules):
                 self.log(f"Processing field: {field}")
-                self.masked_df[field] = self.masked_df[field].apply(
-                    lambda x: self.mask_value(x, rule, field)
-                )
+                self.masked_df[field] = engine.mask_series(self.masked_df[field], field)
                 self.progress_var.set((idx + 1) / total_fields * 100)
                 
+            self.report = MaskingReport(self.masking_rules, bloom_capacity=report_capacity(len(self.df)))
+            self.report.observe(self.df, self.masked_df)
             self.log("Masking completed successfully!")
             self.update_results_view()
             self.notebook.select(self.results_tab)
@@ -444,118 +2528,103 @@ class DataMaskingTool:
         except Exception as e:
             self.log(f"ERROR: {str(e)}")
             messagebox.showerror("Error", f"Masking failed: {str(e)}")
+        finally:
+            engine.close()
             
-    def mask_value(self, value, rule, field_name):
-        """Apply masking to a single value"""
-        if pd.isna(value):
-            return value
-            
-        masking_type = rule['type']
-        options = rule['options']
-        value_str = str(value)
+    def create_engine(self):
+        """Build a masking engine for the current rules"""
+        return MaskingEngine(self.masking_rules, faker=self.faker, reverse_mapping=self.reverse_mapping)
         
-        if masking_type == 'Full Masking (****)':
-            return '*' * len(value_str)
+    def mask_large_file(self):
+        """Mask a large CSV or workbook chunk by chunk without loading it into memory"""
+        if not self.masking_rules:
+            messagebox.showwarning("Warning", "Please define masking rules first")
+            return
             
-        elif masking_type == 'Partial Masking':
-            keep_first = options.get('keep_first', 0)
-            keep_last = options.get('keep_last', 4)
-            if len(value_str) <= keep_first + keep_last:
-                return '*' * len(value_str)
-            masked = value_str[:keep_first] + '*' * (len(value_str) - keep_first - keep_last) + value_str[-keep_last:]
-            return masked
+        input_path = filedialog.askopenfilename(
+            title="Select File to Mask",
+            filetypes=DATA_FILE_TYPES
+        )
+        if not input_path:
+            return
+        output_path = filedialog.asksaveasfilename(
+            title="Save Masked File",
+            defaultextension=".csv",
+            filetypes=DATA_FILE_TYPES
+        )
+        if not output_path:
+            return
             
-        elif masking_type == 'Format-Preserving Encryption':
-            key = options.get('key', '').encode()
-            fernet = Fernet(key)
-            encrypted = fernet.encrypt(value_str.encode())
-            # Store reverse mapping
-            if field_name not in self.reverse_mapping:
-                self.reverse_mapping[field_name] = {}
-            encoded = base64.urlsafe_b64encode(encrypted).decode()
-            self.reverse_mapping[field_name][encoded] = value_str
-            return encoded
+        engine = self.create_engine()
+        try:
+            self.notebook.select(self.process_tab)
+            self.log(f"Streaming file: {Path(input_path).name}")
             
-        elif masking_type == 'Fake Data Replacement':
-            # Intelligent fake data based on field name
-            lower_field = field_name.lower()
-            if 'email' in lower_field:
-                return self.faker.email()
-            elif 'phone' in lower_field:
-                return self.faker.phone_number()
-            elif 'name' in lower_field:
-                if 'first' in lower_field:
-                    return self.faker.first_name()
-                elif 'last' in lower_field:
-                    return self.faker.last_name()
-                return self.faker.name()
-            elif 'address' in lower_field:
-                return self.faker.address()
-            elif 'ssn' in lower_field:
-                return self.faker.ssn()
-            elif 'company' in lower_field:
-                return self.faker.company()
-            else:
-                return self.faker.word()
+            def progress(sheet_name, rows_done):
+                where = f"sheet '{sheet_name}'" if sheet_name else Path(input_path).name
+                self.update_status(f"Masking {where}: {rows_done} rows")
                 
-        elif masking_type == 'Hash (One-way)':
-            return hashlib.sha256(value_str.encode()).hexdigest()[:16]
-            
-        elif masking_type == 'Reversible (with key)':
-            key = options.get('key', '').encode()
-            fernet = Fernet(key)
-            encrypted = fernet.encrypt(value_str.encode())
-            # Store reverse mapping
-            if field_name not in self.reverse_mapping:
-                self.reverse_mapping[field_name] = {}
-            encoded = encrypted.decode()
-            self.reverse_mapping[field_name][encoded] = value_str
-            return encoded
+            self.report = MaskingReport(self.masking_rules, bloom_capacity=report_capacity(estimate_rows(input_path)))
+            total_rows = mask_file(input_path, output_path, engine,
+                                   chunksize=int(self.batch_size.get()), progress=progress,
+                                   io_engine=self.io_engine.get(), report=self.report)
+            self.log(f"Masked {total_rows} rows to {Path(output_path).name}")
+            self.log("Verification report:\n" + self.report.format_text())
+            self.update_status(f"Saved: {Path(output_path).name} ({total_rows} rows)")
+            messagebox.showinfo("Success", f"Masked data saved to {Path(output_path).name}")
+        except Exception as e:
+            self.log(f"ERROR: {str(e)}")
+            messagebox.showerror("Error", f"Masking failed: {str(e)}")
+        finally:
+            engine.close()
             
-        elif masking_type == 'Email Masking':
-            if '@' in value_str:
-                local, domain = value_str.split('@', 1)
-                if len(local) > 2:
-                    masked_local = local[0] + '*' * (len(local) - 2) + local[-1]
-                else:
-                    masked_local = '*' * len(local)
-                return f"{masked_local}@{domain}"
-            return '*' * len(value_str)
+    def unmask_file(self):
+        """Restore original values of reversible columns in a masked file"""
+        input_path = filedialog.askopenfilename(
+            title="Select Masked File",
+            filetypes=DATA_FILE_TYPES
+        )
+        if not input_path:
+            return
             
-        elif masking_type == 'Phone Masking':
-            # Keep last 4 digits
-            digits = re.sub(r'\D', '', value_str)
-            if len(digits) >= 4:
-                return '*' * (len(value_str) - 4) + value_str[-4:]
-            return '*' * len(value_str)
+        store_path = None
+        has_keys = any(rule['type'] in REVERSIBLE_TYPES and rule['options'].get('key')
+                       for rule in self.masking_rules.values())
+        if not has_keys:
+            store_path = filedialog.askopenfilename(
+                title="Select Reverse Mapping Store",
+                filetypes=[("SQLite mapping store", "*.db"), ("All files", "*.*")]
+            )
+            if not store_path:
+                return
+                
+        output_path = filedialog.asksaveasfilename(
+            title="Save Unmasked Data",
+            defaultextension=data_suffix(input_path) or ".csv",
+            filetypes=DATA_FILE_TYPES
+        )
+        if not output_path:
+            return
             
-        elif masking_type == 'SSN Masking':
-            # Keep last 4 digits
-            digits = re.sub(r'\D', '', value_str)
-            if len(digits) >= 4:
-                return '***-**-' + digits[-4:]
-            return '*' * len(value_str)
+        try:
+            self.notebook.select(self.process_tab)
+            self.log(f"Unmasking: {Path(input_path).name}")
             
-        elif masking_type == 'Date Shifting':
-            try:
-                shift_days = options.get('shift_days', 30)
-                date_value = pd.to_datetime(value)
-                shifted = date_value + pd.Timedelta(days=shift_days)
-                return shifted.strftime('%Y-%m-%d')
-            except:
-                return value
-                
-        elif masking_type == 'Number Randomization':
-            try:
-                num = float(value)
-                # Add random noise (±10%)
-                noise = num * 0.1 * (2 * self.faker.random.random() - 1)
-                return round(num + noise, 2)
-            except:
-                return value
+            def progress(sheet_name, rows_done):
+                self.update_status(f"Unmasked {rows_done} rows")
                 
-        return value
-        
+            skipped = {}
+            total_rows = unmask_file(input_path, output_path, rules=self.masking_rules, store_path=store_path,
+                                     chunksize=int(self.batch_size.get()), progress=progress,
+                                     io_engine=self.io_engine.get(), skipped=skipped)
+            self.log(f"Restored {total_rows} rows to {Path(output_path).name}")
+            for field, count in skipped.items():
+                self.log(f"WARNING: {count} values in '{field}' did not decrypt and were left masked")
+            messagebox.showinfo("Success", f"Unmasked data saved to {Path(output_path).name}")
+        except Exception as e:
+            self.log(f"ERROR: {str(e)}")
+            messagebox.showerror("Error", f"Unmasking failed: {str(e)}")
+            
     def update_results_view(self):
         """Update results display"""
         if self.masked_df is not None:
@@ -572,15 +2641,17 @@ class DataMaskingTool:
         file_path = filedialog.asksaveasfilename(
             title="Save Masked Data",
             defaultextension=".csv",
-            filetypes=[("CSV files", "*.csv"), ("Excel files", "*.xlsx"), ("All files", "*.*")]
+            filetypes=DATA_FILE_TYPES
         )
         
         if file_path:
             try:
-                if file_path.endswith('.csv'):
+                if file_path.endswith('.csv') and self.io_engine.get() == 'pandas':
                     self.masked_df.to_csv(file_path, index=False)
-                elif file_path.endswith('.xlsx'):
-                    self.masked_df.to_excel(file_path, index=False)
+                elif file_path.endswith(('.csv', '.xlsx')) or detect_compression(file_path):
+                    with open_chunk_writer(file_path, io_engine=self.io_engine.get()) as writer:
+                        for start in range(0, max(len(self.masked_df), 1), DEFAULT_CHUNK_ROWS):
+                            writer.write_chunk("Sheet1", self.masked_df.iloc[start:start + DEFAULT_CHUNK_ROWS])
                 else:
                     self.masked_df.to_csv(file_path, index=False)
                     
@@ -633,13 +2704,18 @@ class DataMaskingTool:
         file_path = filedialog.asksaveasfilename(
             title="Export Reverse Mapping",
             defaultextension=".json",
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+            filetypes=[("JSON files", "*.json"), ("SQLite mapping store", "*.db"), ("All files", "*.*")]
         )
         
         if file_path:
             try:
-                with open(file_path, 'w') as f:
-                    json.dump(self.reverse_mapping, f, indent=2)
+                if file_path.endswith('.db'):
+                    store = ReverseMappingStore(file_path)
+                    store.add_mapping(self.reverse_mapping)
+                    store.close()
+                else:
+                    with open(file_path, 'w') as f:
+                        json.dump(self.reverse_mapping, f, indent=2)
                 messagebox.showinfo("Success", "Reverse mapping exported successfully")
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to export: {str(e)}")
@@ -670,13 +2746,200 @@ class DataMaskingTool:
         masked_text = scrolledtext.ScrolledText(masked_frame, wrap=tk.NONE)
         masked_text.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
         masked_text.insert(1.0, self.masked_df.head(20).to_string())
+        
+    def show_report(self):
+        """Show the verification report of the last masking run"""
+        if self.report is None:
+            messagebox.showwarning("Warning", "Apply masking first")
+            return
+            
+        report_window = tk.Toplevel(self.root)
+        report_window.title("Verification Report")
+        report_window.geometry("800x600")
+        
+        control_frame = ttk.Frame(report_window)
+        control_frame.pack(fill=tk.X, padx=5, pady=5)
+        ttk.Button(control_frame, text="Save as JSON", command=self.save_report).pack(side=tk.LEFT, padx=5)
+        
+        report_text = scrolledtext.ScrolledText(report_window, wrap=tk.NONE)
+        report_text.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        report_text.insert(1.0, self.report.format_text())
+        
+    def save_report(self):
+        """Save the verification report to JSON"""
+        file_path = filedialog.asksaveasfilename(
+            title="Save Verification Report",
+            defaultextension=".json",
+            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+        )
+        
+        if file_path:
+            try:
+                self.report.save(file_path)
+                messagebox.showinfo("Success", "Report saved successfully")
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to save: {str(e)}")
+
+
+def run_unmask(args):
+    """CLI entry point for bulk unmasking"""
+    if not args.rules and not args.mapping:
+        print("unmask needs --rules and/or --mapping", file=sys.stderr)
+        return 2
+    rules = None
+    if args.rules:
+        with open(args.rules, 'r') as f:
+            rules = json.load(f)
+    store_path = args.mapping
+    temporary_store = False
+    if store_path and store_path.endswith('.json'):
+        # JSON mappings are converted into an indexed store, cached next to them
+        store_path, temporary_store = store_for_json(store_path)
+    skipped = {}
+    try:
+        total_rows = unmask_file(args.input, args.output, rules=rules, store_path=store_path,
+                                 chunksize=args.chunksize, workers=args.workers, io_engine=args.io_engine,
+                                 skipped=skipped)
+    finally:
+        if temporary_store:
+            Path(store_path).unlink(missing_ok=True)
+    print(f"Unmasked {total_rows} rows to {args.output}")
+    for field, count in skipped.items():
+        print(f"Warning: {count} values in '{field}' did not decrypt and were left masked", file=sys.stderr)
+    return 0
+
+
+def run_mask(args):
+    """CLI entry point for streaming a file through a rule set"""
+    with open(args.rules, 'r') as f:
+        rules = json.load(f)
+    engine = MaskingEngine(rules, track_reverse_mapping=False)
+    report = None
+    if args.report:
+        capacity = args.report_capacity or report_capacity(estimate_rows(args.input))
+        report = MaskingReport(rules, bloom_capacity=capacity)
+    try:
+        total_rows = mask_file(args.input, args.output, engine, chunksize=args.chunksize,
+                               compression_level=args.compression_level, io_engine=args.io_engine,
+                               report=report)
+    finally:
+        engine.close()
+    print(f"Masked {total_rows} rows to {args.output}")
+    if report is not None:
+        report.save(args.report)
+        print(report.format_text())
+    return 0
+
+
+def run_serve(args):
+    """CLI entry point for the long-running masking service"""
+    service = MaskingService(load_rule_sets(args.rules), workers=args.workers,
+                             fake_pool_size=args.fake_pool_size)
+    where = args.socket or f"http://{args.host}:{args.port}"
+    try:
+        asyncio.run(service.serve(args.host, args.port, args.socket,
+                                  ready=lambda server: print(f"Masking service listening on {where}", flush=True)))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def run_coordinate(args):
+    """CLI entry point for sharded masking with local workers"""
+    manifest_path = Path(args.work_dir) / MANIFEST_NAME
+    if manifest_path.exists():
+        print(f"Resuming from {manifest_path}")
+    else:
+        if not args.input or not args.rules:
+            print("coordinate needs --input and --rules to plan a new run", file=sys.stderr)
+            return 2
+        plan_shards(args.input, args.rules, args.work_dir, args.output,
+                    shard_bytes=args.shard_size_mb * 1024 * 1024, mask_key=args.mask_key)
+        print(f"Wrote shard manifest to {manifest_path}")
+    coordinate_shards(manifest_path, workers=args.workers, max_attempts=args.max_attempts,
+                      chunksize=args.chunksize, io_engine=args.io_engine,
+                      compression_level=args.compression_level)
+    return 0
+
+
+def run_worker(args):
+    """CLI entry point for a shard worker"""
+    failures = run_shard_worker(args.manifest, args.worker_id, args.chunksize, args.io_engine)
+    return 1 if failures else 0
+
+
+def build_parser():
+    """Build the command-line parser; with no arguments the GUI is started"""
+    parser = argparse.ArgumentParser(description="Data Masking & Anonymization Tool")
+    subparsers = parser.add_subparsers(dest='command')
+    
+    mask_parser = subparsers.add_parser('mask', help="Mask a CSV, compressed CSV or XLSX file in chunks")
+    mask_parser.add_argument('input', help="Input .csv, .csv.gz/.bz2/.zst or .xlsx file")
+    mask_parser.add_argument('output', help="Output file; a .gz/.bz2/.zst suffix compresses it")
+    mask_parser.add_argument('--rules', required=True, help="Rules JSON file")
+    mask_parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNK_ROWS, help="Rows per batch")
+    mask_parser.add_argument('--compression-level', type=int, help="Codec compression level")
+    mask_parser.add_argument('--io-engine', choices=IO_ENGINES, default='pandas', help="CSV parser and writer")
+    mask_parser.add_argument('--report', help="Write a verification report (JSON) to this path")
+    mask_parser.add_argument('--report-capacity', type=int,
+                             help="Distinct values per column the report is sized for (default: estimated rows)")
+    mask_parser.set_defaults(func=run_mask)
+    
+    unmask_parser = subparsers.add_parser('unmask', help="Restore reversible columns of a masked file")
+    unmask_parser.add_argument('input', help="Masked CSV or XLSX file")
+    unmask_parser.add_argument('output', help="Output CSV or XLSX file")
+    unmask_parser.add_argument('--rules', help="Rules JSON with the encryption keys")
+    unmask_parser.add_argument('--mapping', help="Reverse mapping store (.db) or exported mapping (.json)")
+    unmask_parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNK_ROWS, help="Rows per batch")
+    unmask_parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Worker processes")
+    unmask_parser.add_argument('--io-engine', choices=IO_ENGINES, default='pandas', help="CSV parser and writer")
+    unmask_parser.set_defaults(func=run_unmask)
+    
+    serve_parser = subparsers.add_parser('serve', help="Run the masking service with warm rule sets")
+    serve_parser.add_argument('--rules', required=True, help="Rules JSON file or directory of rule sets")
+    serve_parser.add_argument('--host', default='127.0.0.1', help="Address to listen on")
+    serve_parser.add_argument('--port', type=int, default=8765, help="TCP port to listen on")
+    serve_parser.add_argument('--socket', help="Listen on this Unix socket instead of TCP")
+    serve_parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Worker processes")
+    serve_parser.add_argument('--fake-pool-size', type=int, default=1000,
+                              help="Pre-generated fake values per field (0 generates every value)")
+    serve_parser.set_defaults(func=run_serve)
+    
+    coordinate_parser = subparsers.add_parser('coordinate', help="Mask a file or directory in shards")
+    coordinate_parser.add_argument('work_dir', help="Shared directory for the manifest, state and parts")
+    coordinate_parser.add_argument('--input', help="Input file or directory (needed to plan a new run)")
+    coordinate_parser.add_argument('--rules', help="Rules JSON file (needed to plan a new run)")
+    coordinate_parser.add_argument('--output', help="Merge CSV parts into this file (.gz/.bz2/.zst compresses)")
+    coordinate_parser.add_argument('--shard-size-mb', type=int, default=DEFAULT_SHARD_BYTES // (1024 * 1024),
+                                   help="Target size of byte-range shards")
+    coordinate_parser.add_argument('--mask-key', help="Key for deterministic fake and randomized values (default: random)")
+    coordinate_parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                                   help="Local worker processes (0 waits for remote workers only)")
+    coordinate_parser.add_argument('--max-attempts', type=int, default=3, help="Attempts per shard")
+    coordinate_parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNK_ROWS, help="Rows per batch")
+    coordinate_parser.add_argument('--io-engine', choices=IO_ENGINES, default='pandas', help="CSV parser and writer")
+    coordinate_parser.add_argument('--compression-level', type=int, help="Codec level for the merged output")
+    coordinate_parser.set_defaults(func=run_coordinate)
+    
+    worker_parser = subparsers.add_parser('worker', help="Mask shards listed in a shard manifest")
+    worker_parser.add_argument('manifest', help="Path to the shard manifest")
+    worker_parser.add_argument('--worker-id', help="Name recorded in claim and done files")
+    worker_parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNK_ROWS, help="Rows per batch")
+    worker_parser.add_argument('--io-engine', choices=IO_ENGINES, default='pandas', help="CSV parser and writer")
+    worker_parser.set_defaults(func=run_worker)
+    
+    return parser
 
 
-def main():
-    root = tk.Tk()
-    app = DataMaskingTool(root)
-    root.mainloop()
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command is None:
+        root = tk.Tk()
+        app = DataMaskingTool(root)
+        root.mainloop()
+        return 0
+    return args.func(args)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,45 @@
+"""
+Tests for the masked-output verification report
+Run with: python -m pytest test_report.py
+"""
+
+import pandas as pd
+
+from data_masking_tool import REPORT_BLOOM_CAPACITY, MaskingEngine, MaskingReport, report_capacity
+
+RULES = {'email': {'type': 'Hash (One-way)', 'options': {}}}
+
+
+def observe_in_chunks(report, original, masked, chunksize=5000):
+    for start in range(0, len(original), chunksize):
+        report.observe(original.iloc[start:start + chunksize], masked.iloc[start:start + chunksize])
+
+
+def test_clean_hash_column_reports_no_leaks_or_collisions():
+    original = pd.DataFrame({'email': [f'user{i}@example.com' for i in range(50000)]})
+    masked = MaskingEngine(RULES).mask_chunk(original)
+    report = MaskingReport(RULES, bloom_capacity=report_capacity(len(original)))
+    observe_in_chunks(report, original, masked)
+    entry = report.to_dict()['columns']['email']
+    assert entry['leaked_values_est'] == 0
+    assert entry['hash_collisions_est'] == 0
+    assert entry['leaked_values_expected_fp'] < 0.1
+    assert report.to_dict()['warnings'] == []
+
+
+def test_repeated_leaks_are_counted_once():
+    original = pd.DataFrame({'email': ['a', 'b', 'c', 'd'] * 5000})
+    report = MaskingReport(RULES, bloom_capacity=report_capacity(len(original)))
+    observe_in_chunks(report, original, original.copy())
+    entry = report.to_dict()['columns']['email']
+    assert entry['leaked_values_est'] == 4
+    assert entry['unchanged_cells'] == len(original)
+
+
+def test_capacity_is_capped_and_overflow_warns():
+    assert report_capacity(10 ** 9) == REPORT_BLOOM_CAPACITY
+    original = pd.DataFrame({'email': [str(i) for i in range(5000)]})
+    report = MaskingReport(RULES, bloom_capacity=100)
+    observe_in_chunks(report, original, MaskingEngine(RULES).mask_chunk(original))
+    assert report.to_dict()['warnings']
+    assert report.format_text().startswith("WARNING: email")
@@ -0,0 +1,53 @@
+"""
+Tests for free-text PII scrubbing
+Run with: python -m pytest test_scrubbing.py
+"""
+
+import pandas as pd
+
+from data_masking_tool import DEFAULT_CHUNK_ROWS, PARALLEL_SCRUB_MIN_CELLS, MaskingEngine, TextScrubber, mask_file
+
+
+def sample_notes(rows):
+    return pd.Series([
+        f"Call 555-123-{i % 10000:04d} or mail user{i}@example.com about case {i}" if i % 3 else None
+        for i in range(rows)
+    ])
+
+
+def test_scrub_replaces_each_pattern():
+    scrubber = TextScrubber(strategies={'PHONE': 'mask'})
+    text = "SSN 123-45-6789, card 4111 1111 1111 1111, mail a.b@example.org, phone (555) 123-4567"
+    assert scrubber.scrub(text) == "SSN [SSN], card [CREDIT_CARD], mail [EMAIL], phone **************"
+
+
+def test_streamed_chunks_use_the_worker_pool():
+    assert PARALLEL_SCRUB_MIN_CELLS < DEFAULT_CHUNK_ROWS
+    notes = sample_notes(PARALLEL_SCRUB_MIN_CELLS * 2)
+    serial = TextScrubber().scrub_series(notes)
+    scrubber = TextScrubber(workers=2)
+    try:
+        parallel = scrubber.scrub_series(notes)
+        assert scrubber._executor is not None
+    finally:
+        scrubber.close()
+    assert parallel.tolist() == serial.tolist()
+    assert parallel.isna().tolist() == notes.isna().tolist()
+
+
+def test_mask_file_scrubs_through_the_pool(tmp_path):
+    input_path = tmp_path / 'notes.csv'
+    notes = sample_notes(12000)
+    pd.DataFrame({'id': range(len(notes)), 'notes': notes}).to_csv(input_path, index=False)
+    rules = {'notes': {'type': 'Free-Text Scrubbing', 'options': {'workers': 2}}}
+    engine = MaskingEngine(rules)
+    try:
+        assert mask_file(input_path, tmp_path / 'out.csv', engine, chunksize=5000) == len(notes)
+        assert engine.get_scrubber('notes', rules['notes']['options'])._executor is not None
+    finally:
+        engine.close()
+    masked = pd.read_csv(tmp_path / 'out.csv')
+    expected = TextScrubber().scrub_series(pd.read_csv(input_path)['notes'])
+    assert masked['id'].tolist() == list(range(len(notes)))
+    assert masked['notes'].fillna('').tolist() == expected.fillna('').tolist()
+    assert not masked['notes'].str.contains('@example.com', na=False).any()
@@ -0,0 +1,120 @@
+"""
+Tests for the long-running masking service
+Run with: python -m pytest test_service.py
+"""
+
+import asyncio
+import http.client
+import json
+import socket
+import threading
+
+import pandas as pd
+import pytest
+
+from data_masking_tool import ARROW_STREAM_TYPE, NDJSON_TYPE, MaskingService
+
+RULES = {
+    'customers': {
+        'email': {'type': 'Hash (One-way)', 'options': {}},
+        'name': {'type': 'Full Masking (****)', 'options': {}},
+    }
+}
+RECORDS = [{'email': 'a@example.com', 'name': 'Ann'}, {'email': 'b@example.com', 'name': 'Bob'}]
+BODY = ''.join(json.dumps(record) + '\n' for record in RECORDS).encode()
+
+
+@pytest.fixture
+def service():
+    """Run a MaskingService on an ephemeral port in a background thread"""
+    service = MaskingService(RULES)
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    ports = []
+
+    def ready(server):
+        ports.append(server.sockets[0].getsockname()[1])
+        started.set()
+
+    task = loop.create_task(service.serve(port=0, ready=ready))
+
+    def run():
+        try:
+            loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            loop.close()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    assert started.wait(10)
+    service.port = ports[0]
+    yield service
+    loop.call_soon_threadsafe(task.cancel)
+    thread.join(10)
+
+
+def post(service, body, content_type=NDJSON_TYPE, **kwargs):
+    conn = http.client.HTTPConnection('127.0.0.1', service.port, timeout=10)
+    conn.request('POST', '/mask/customers', body=body, headers={'Content-Type': content_type}, **kwargs)
+    response = conn.getresponse()
+    return response.status, response.read()
+
+
+def masked_records(payload):
+    return [json.loads(line) for line in payload.decode().splitlines()]
+
+
+def test_content_length_request(service):
+    status, payload = post(service, BODY)
+    assert status == 200
+    records = masked_records(payload)
+    assert [record['name'] for record in records] == ['***', '***']
+    assert records[0]['email'] != RECORDS[0]['email']
+
+
+def test_chunked_request(service):
+    status, payload = post(service, iter([BODY[:10], BODY[10:]]), encode_chunked=True)
+    assert status == 200
+    assert len(masked_records(payload)) == 2
+
+
+def test_arrow_request(service):
+    pa = pytest.importorskip('pyarrow')
+    table = pa.Table.from_pandas(pd.DataFrame(RECORDS), preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as stream:
+        stream.write_table(table)
+    status, payload = post(service, sink.getvalue().to_pybytes(), ARROW_STREAM_TYPE)
+    assert status == 200
+    masked = pa.ipc.open_stream(payload).read_all().to_pandas()
+    assert masked['name'].tolist() == ['***', '***']
+
+
+def test_expect_continue_and_keep_alive(service):
+    with socket.create_connection(('127.0.0.1', service.port), timeout=10) as sock:
+        sock.sendall(b"POST /mask/customers HTTP/1.1\r\nHost: x\r\n"
+                     b"Content-Length: %d\r\nExpect: 100-continue\r\n\r\n" % len(BODY))
+        assert sock.recv(1024).startswith(b"HTTP/1.1 100 Continue")
+        sock.sendall(BODY)
+        sock.sendall(b"GET /health HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n")
+        data = b''
+        while chunk := sock.recv(65536):
+            data += chunk
+    assert data.count(b"HTTP/1.1 200 OK") == 2
+
+
+def test_malformed_chunk_gets_400(service):
+    with socket.create_connection(('127.0.0.1', service.port), timeout=10) as sock:
+        sock.sendall(b"POST /mask/customers HTTP/1.1\r\nHost: x\r\n"
+                     b"Transfer-Encoding: chunked\r\n\r\nzz\r\n")
+        assert sock.recv(1024).startswith(b"HTTP/1.1 400 Bad Request")
+
+
+def test_bad_body_gets_400_and_server_fault_gets_500(service):
+    status, _ = post(service, b"not json\n")
+    assert status == 400
+    service.executor.shutdown()
+    status, _ = post(service, BODY)
+    assert status == 500
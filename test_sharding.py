@@ -0,0 +1,112 @@
+"""
+Tests for sharded masking with several local workers
+Run with: python -m pytest test_sharding.py
+"""
+
+import gzip
+import json
+import os
+import time
+
+import pandas as pd
+import pytest
+
+from data_masking_tool import (
+    ShardClaimLost, ShardState, coordinate_shards, load_manifest, plan_shards, run_shard_worker,
+)
+
+RULES = {
+    'email': {'type': 'Hash (One-way)', 'options': {}},
+    'name': {'type': 'Fake Data Replacement', 'options': {}},
+    'amount': {'type': 'Number Randomization', 'options': {}},
+}
+
+
+def write_inputs(tmp_path, rows=3000):
+    """Write a CSV whose values repeat across shards, plus the rules file"""
+    df = pd.DataFrame({
+        'id': range(rows),
+        'email': [f'user{i % 50}@example.com' for i in range(rows)],
+        'name': [f'Person {i % 50}' for i in range(rows)],
+        'amount': [float(i % 50) * 10 for i in range(rows)],
+    })
+    input_path = tmp_path / 'input.csv'
+    df.to_csv(input_path, index=False)
+    rules_path = tmp_path / 'rules.json'
+    rules_path.write_text(json.dumps(RULES))
+    return df, input_path, rules_path
+
+
+def test_coordinate_with_workers_and_retries(tmp_path):
+    df, input_path, rules_path = write_inputs(tmp_path)
+    output_path = tmp_path / 'masked.csv.gz'
+    manifest_path = plan_shards(input_path, rules_path, tmp_path / 'work', output_path, shard_bytes=16 * 1024)
+    shards = load_manifest(manifest_path)['shards']
+    assert len(shards) >= 4
+
+    # Force retries: one shard failed earlier, another was claimed by a worker that died
+    state = ShardState(manifest_path)
+    (state.dir / f"{shards[0]['id']}.failed").write_text("ghost: simulated failure")
+    assert state.claim(shards[1], 'ghost')
+    expired = time.time() - 3600
+    os.utime(state.dir / f"{shards[1]['id']}.claim", (expired, expired))
+
+    total_rows = coordinate_shards(manifest_path, workers=3, log=lambda message: None)
+
+    assert total_rows == len(df)
+    assert (state.dir / '_SUCCESS').exists()
+    masked = pd.read_csv(output_path)
+    assert masked['id'].tolist() == df['id'].tolist()
+    # Keyed modes: the same original gets the same masked value in every shard
+    for field in RULES:
+        pairs = pd.DataFrame({'original': df[field], 'masked': masked[field]}).drop_duplicates()
+        assert pairs['original'].is_unique
+    assert not masked['name'].isin(df['name']).any()
+
+
+def test_lost_claim_does_not_fail_shard(tmp_path):
+    _, input_path, rules_path = write_inputs(tmp_path, rows=100)
+    manifest_path = plan_shards(input_path, rules_path, tmp_path / 'work')
+    shard = load_manifest(manifest_path)['shards'][0]
+    state = ShardState(manifest_path)
+
+    assert state.claim(shard, 'slow')
+    state.reset(shard)
+    assert state.claim(shard, 'fast')
+    with pytest.raises(ShardClaimLost):
+        state.heartbeat(shard, 'slow')
+    state.mark_failed(shard, 'slow', "slow: claim lost")
+    assert state.owner(shard) == 'fast'
+    assert state.status(shard) == 'running'
+
+
+def test_directory_shards_keep_compression(tmp_path):
+    df, input_path, rules_path = write_inputs(tmp_path, rows=500)
+    input_dir = tmp_path / 'in'
+    input_dir.mkdir()
+    with open(input_path, 'rb') as source, gzip.open(input_dir / 'a.csv.gz', 'wb') as target:
+        target.write(source.read())
+    df.to_csv(input_dir / 'b.csv', index=False)
+    output_path = tmp_path / 'merged.csv'
+    manifest_path = plan_shards(input_dir, rules_path, tmp_path / 'work', output_path)
+
+    assert run_shard_worker(manifest_path, 'worker-1') == 0
+    part = load_manifest(manifest_path)['shards'][0]['output']
+    assert part.endswith('a.csv.gz')
+    assert len(pd.read_csv(part)) == len(df)
+
+    coordinate_shards(manifest_path, workers=0, log=lambda message: None)
+    assert len(pd.read_csv(output_path)) == 2 * len(df)
+
+
+def test_header_only_input_keeps_columns(tmp_path):
+    _, _, rules_path = write_inputs(tmp_path, rows=1)
+    input_path = tmp_path / 'empty.csv'
+    input_path.write_text('id,email,name,amount\n')
+    output_path = tmp_path / 'masked.csv'
+    manifest_path = plan_shards(input_path, rules_path, tmp_path / 'work', output_path)
+    assert len(load_manifest(manifest_path)['shards']) == 1
+
+    assert run_shard_worker(manifest_path, 'worker-1') == 0
+    assert coordinate_shards(manifest_path, workers=0, log=lambda message: None) == 0
+    assert output_path.read_text() == 'id,email,name,amount\n'
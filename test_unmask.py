@@ -0,0 +1,93 @@
+"""
+Tests for bulk unmasking of reversible columns
+Run with: python -m pytest test_unmask.py
+"""
+
+import json
+import os
+
+import pandas as pd
+from cryptography.fernet import Fernet
+
+from data_masking_tool import MaskingEngine, mask_file, store_for_json, unmask_file
+
+
+def make_rules():
+    return {
+        'account': {'type': 'Reversible (with key)', 'options': {'key': Fernet.generate_key().decode()}},
+        'card': {'type': 'Format-Preserving Encryption', 'options': {'key': Fernet.generate_key().decode()}},
+        'email': {'type': 'Hash (One-way)', 'options': {}},
+    }
+
+
+def mask_sample(tmp_path, rules, rows=300):
+    """Mask a sample file; returns (original DataFrame, masked path, reverse mapping)"""
+    df = pd.DataFrame({
+        'account': [f'ACC{i:05d}' for i in range(rows)],
+        'card': [f'4111-0000-{i:04d}' for i in range(rows)],
+        'email': [f'user{i}@example.com' for i in range(rows)],
+    })
+    input_path = tmp_path / 'input.csv'
+    masked_path = tmp_path / 'masked.csv'
+    df.to_csv(input_path, index=False)
+    engine = MaskingEngine(rules)
+    mask_file(input_path, masked_path, engine, chunksize=100)
+    return df, masked_path, engine.reverse_mapping
+
+
+def test_unmask_with_keys(tmp_path):
+    rules = make_rules()
+    df, masked_path, _ = mask_sample(tmp_path, rules)
+    for workers in (1, 2):
+        output_path = tmp_path / f'restored_{workers}.csv'
+        skipped = {}
+        assert unmask_file(masked_path, output_path, rules=rules, chunksize=100,
+                           workers=workers, skipped=skipped) == len(df)
+        restored = pd.read_csv(output_path)
+        assert restored['account'].tolist() == df['account'].tolist()
+        assert restored['card'].tolist() == df['card'].tolist()
+        assert skipped == {}
+
+
+def test_unmask_with_store(tmp_path):
+    rules = make_rules()
+    df, masked_path, mapping = mask_sample(tmp_path, rules)
+    json_path = tmp_path / 'mapping.json'
+    json_path.write_text(json.dumps(mapping))
+    store_path, temporary = store_for_json(json_path)
+    assert not temporary
+    output_path = tmp_path / 'restored.csv'
+    unmask_file(masked_path, output_path, store_path=store_path, chunksize=100, workers=2)
+    restored = pd.read_csv(output_path)
+    assert restored['account'].tolist() == df['account'].tolist()
+    assert restored['card'].tolist() == df['card'].tolist()
+
+
+def test_store_rebuilt_when_json_changes(tmp_path):
+    json_path = tmp_path / 'mapping.json'
+    json_path.write_text(json.dumps({'account': {'token': 'old'}}))
+    store_path, _ = store_for_json(json_path)
+    # Re-export with a newer timestamp than the cached store
+    json_path.write_text(json.dumps({'account': {'token': 'new'}}))
+    newer = os.stat(store_path).st_mtime + 10
+    os.utime(json_path, (newer, newer))
+    store_path, _ = store_for_json(json_path)
+    masked_path = tmp_path / 'masked.csv'
+    pd.DataFrame({'account': ['token']}).to_csv(masked_path, index=False)
+    output_path = tmp_path / 'restored.csv'
+    unmask_file(masked_path, output_path, store_path=store_path)
+    assert pd.read_csv(output_path)['account'].tolist() == ['new']
+
+
+def test_wrong_key_values_are_skipped(tmp_path):
+    rules = make_rules()
+    df, masked_path, _ = mask_sample(tmp_path, rules, rows=50)
+    masked = pd.read_csv(masked_path)
+    masked.loc[:4, 'account'] = 'not-a-token'
+    masked.to_csv(masked_path, index=False)
+    skipped = {}
+    unmask_file(masked_path, tmp_path / 'restored.csv', rules=rules, workers=2, skipped=skipped)
+    restored = pd.read_csv(tmp_path / 'restored.csv')
+    assert skipped == {'account': 5}
+    assert restored['account'].tolist()[:5] == ['not-a-token'] * 5
+    assert restored['account'].tolist()[5:] == df['account'].tolist()[5:]